@@ -1,4 +1,4 @@
-import { useEffect, useMemo, useState } from "react";
+import { useEffect, useMemo, useRef, useState } from "react";
 import "./app.css";
 
 import {
@@ -16,6 +16,12 @@ import {
 
 const ESTADOS = ["transporte", "viajes en camino", "viajes concretados"];
 
+// Identifica a esta pestaña: los eventos de /events con este "origen" son
+// cambios propios, que ya se aplicaron con la respuesta del request.
+const CLIENT_ID =
+  (window.crypto && window.crypto.randomUUID && window.crypto.randomUUID()) ||
+  `${Date.now()}-${Math.random().toString(16).slice(2)}`;
+
 function buildQuery(params) {
   const qs = new URLSearchParams();
   Object.entries(params).forEach(([k, v]) => {
@@ -55,6 +61,45 @@ function formatAnioMes(v) {
 
 const pieColors = ["#111827", "#2563eb", "#16a34a"];
 
+const AGG_KEYS = ["cantidad", "cobrado", "pagado", "diferencia"];
+
+// Suma un delta de /events a una fila de /analytics
+function addDelta(row, d) {
+  const out = { ...row };
+  AGG_KEYS.forEach((k) => {
+    if (k in out || k in d) out[k] = Number(out[k] ?? 0) + Number(d[k] ?? 0);
+  });
+  return out;
+}
+
+// Aplica {clave: delta} a una lista agrupada (por_mes / por_estado)
+function patchGroups(rows, keyName, deltas) {
+  if (!deltas) return rows;
+  let out = [...rows];
+  Object.entries(deltas).forEach(([key, d]) => {
+    const i = out.findIndex((r) => String(r[keyName]) === key);
+    if (i >= 0) {
+      out[i] = addDelta(out[i], d);
+    } else {
+      const row = addDelta({ [keyName]: key === "null" ? null : key }, d);
+      if (keyName === "anio_mes") delete row.cantidad;
+      out.push(row);
+    }
+  });
+  out = out.filter((r) => r.cantidad === undefined || r.cantidad > 0);
+  return out.sort((a, b) => String(a[keyName]).localeCompare(String(b[keyName])));
+}
+
+function patchDash(dash, delta) {
+  if (!dash || !delta) return dash;
+  return {
+    ...dash,
+    totales: delta.totales ? addDelta(dash.totales, delta.totales) : dash.totales,
+    por_mes: patchGroups(dash.por_mes || [], "anio_mes", delta.por_mes),
+    por_estado: patchGroups(dash.por_estado || [], "estado", delta.por_estado),
+  };
+}
+
 export default function App() {
   const [tab, setTab] = useState("listado"); // "listado" | "cargar" | "dashboard"
 
@@ -83,7 +128,6 @@ export default function App() {
     fecha: "",
     dia: "",
     o_carga: "",
-    anio_mes: "",
     cliente_destino: "",
     transportista_id: "",
     cod_transporte: "",
@@ -162,6 +206,87 @@ export default function App() {
     // eslint-disable-next-line react-hooks/exhaustive-deps
   }, [tab]);
 
+  // Último estado de filtros / recarga, para el listener de /events
+  const liveRef = useRef({});
+  liveRef.current = {
+    filtros: { estado, anioMes, transportistaId, q, offset },
+    recargar: () => {
+      if (tab === "listado") loadFletes();
+      if (tab === "dashboard") loadDashboard();
+    },
+  };
+
+  // Feed de cambios de otros operadores: parchea fletes / dashboard en vez de re-pedir todo
+  useEffect(() => {
+    const es = new EventSource("/api/events");
+
+    function matchFiltros(f) {
+      const { estado, anioMes, transportistaId, q, offset } = liveRef.current.filtros;
+      if (offset !== 0) return false;
+      if (estado && f.estado !== estado) return false;
+      if (anioMes && String(f.anio_mes) !== anioMes.replace("-", "")) return false;
+      if (transportistaId && f.transportista_id !== Number(transportistaId)) return false;
+      if (q) {
+        const qq = q.trim().toLowerCase();
+        const hay = `${f.o_carga} ${f.cliente_destino || ""}`.toLowerCase();
+        if (!hay.includes(qq)) return false;
+      }
+      return true;
+    }
+
+    es.addEventListener("flete_creado", (ev) => {
+      const data = JSON.parse(ev.data);
+      if (data.origen === CLIENT_ID) return;
+      if (matchFiltros(data.flete)) {
+        setFletes((prev) => [data.flete, ...prev.filter((f) => f.o_carga !== data.o_carga)]);
+      }
+      setDash((prev) =>
+        patchDash(prev, {
+          totales: data.delta,
+          por_mes: data.anio_mes ? { [data.anio_mes]: data.delta } : null,
+          por_estado: { [String(data.estado)]: data.delta },
+        })
+      );
+    });
+
+    es.addEventListener("estado_cambiado", (ev) => {
+      const data = JSON.parse(ev.data);
+      if (data.origen === CLIENT_ID) return;
+      const { estado } = liveRef.current.filtros;
+      setFletes((prev) =>
+        prev
+          .map((f) => (f.o_carga === data.o_carga ? { ...f, estado: data.estado } : f))
+          .filter((f) => f.o_carga !== data.o_carga || !estado || estado === data.estado)
+      );
+      setDash((prev) => patchDash(prev, data.delta));
+    });
+
+    es.addEventListener("import_finalizado", (ev) => {
+      const data = JSON.parse(ev.data);
+      if (data.origen === CLIENT_ID) return;
+      if (data.transportistas_created > 0) loadTransportistas().catch(() => {});
+      if (data.inserted > 0) {
+        setDash((prev) => patchDash(prev, data.delta));
+        if (liveRef.current.filtros.offset === 0) liveRef.current.recargar();
+      }
+    });
+
+    es.addEventListener("fletes_archivados", () => liveRef.current.recargar());
+
+    es.addEventListener("transportista_creado", (ev) => {
+      const t = JSON.parse(ev.data);
+      if (t.origen === CLIENT_ID) return;
+      setTransportistas((prev) =>
+        prev.some((x) => x.id === t.id)
+          ? prev
+          : [...prev, { id: t.id, nombre: t.nombre }].sort((a, b) => a.nombre.localeCompare(b.nombre))
+      );
+    });
+
+    return () => es.close();
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, []);
+
   function resetOffset() {
     setOffset(0);
   }
@@ -171,15 +296,19 @@ export default function App() {
     try {
       const res = await fetch(`/api/fletes/${encodeURIComponent(o_carga)}/estado`, {
         method: "PATCH",
-        headers: { "Content-Type": "application/json" },
+        headers: { "Content-Type": "application/json", "X-Client-Id": CLIENT_ID },
         body: JSON.stringify({ estado: nuevoEstado }),
       });
       if (!res.ok) {
         const err = await res.json().catch(() => ({}));
         throw new Error(err.detail || "Error cambiando estado");
       }
-      await loadFletes();
-      if (tab === "dashboard") await loadDashboard();
+      const data = await res.json();
+      setFletes((prev) =>
+        prev
+          .map((f) => (f.o_carga === data.o_carga ? { ...f, estado: data.estado } : f))
+          .filter((f) => f.o_carga !== data.o_carga || !estado || estado === data.estado)
+      );
     } catch (e) {
       setMsg(String(e.message || e));
     }
@@ -191,7 +320,11 @@ export default function App() {
     try {
       const formData = new FormData();
       formData.append("file", file);
-      const res = await fetch("/api/import-excel", { method: "POST", body: formData });
+      const res = await fetch("/api/import-excel", {
+        method: "POST",
+        headers: { "X-Client-Id": CLIENT_ID },
+        body: formData,
+      });
       if (!res.ok) {
         const err = await res.json().catch(() => ({}));
         throw new Error(err.detail || "Error importando Excel");
@@ -202,7 +335,7 @@ export default function App() {
           ", "
         )}`
       );
-      await loadTransportistas();
+      if (data.transportistas_created > 0) await loadTransportistas();
       if (tab === "listado") await loadFletes();
       if (tab === "dashboard") await loadDashboard();
     } catch (e) {
@@ -233,7 +366,7 @@ export default function App() {
     try {
       const res = await fetch("/api/transportistas", {
         method: "POST",
-        headers: { "Content-Type": "application/json" },
+        headers: { "Content-Type": "application/json", "X-Client-Id": CLIENT_ID },
         body: JSON.stringify({ nombre }),
       });
 
@@ -267,7 +400,6 @@ export default function App() {
         fecha: form.fecha ? form.fecha : null,
         dia: form.dia || null,
         o_carga: form.o_carga.trim(),
-        anio_mes: form.anio_mes || null,
         cliente_destino: form.cliente_destino || null,
         transportista_id: Number(form.transportista_id),
 
@@ -289,7 +421,7 @@ export default function App() {
 
       const res = await fetch("/api/fletes-web", {
         method: "POST",
-        headers: { "Content-Type": "application/json" },
+        headers: { "Content-Type": "application/json", "X-Client-Id": CLIENT_ID },
         body: JSON.stringify(payload),
       });
 
@@ -305,7 +437,6 @@ export default function App() {
         fecha: "",
         dia: "",
         o_carga: "",
-        anio_mes: "",
         cliente_destino: "",
         cod_transporte: "",
         ingrese_transporte: "",
@@ -512,11 +643,6 @@ export default function App() {
               <input value={form.o_carga} onChange={(e) => setForm((p) => ({ ...p, o_carga: e.target.value }))} />
             </div>
 
-            <div>
-              <label>Año/Mes (YYYY-MM)</label>
-              <input value={form.anio_mes} onChange={(e) => setForm((p) => ({ ...p, anio_mes: e.target.value }))} placeholder="2025-03" />
-            </div>
-
             <div style={{ gridColumn: "span 2" }}>
               <label>Cliente / Destino</label>
               <input value={form.cliente_destino} onChange={(e) => setForm((p) => ({ ...p, cliente_destino: e.target.value }))} />
@@ -0,0 +1,69 @@
+from datetime import date
+
+from sqlalchemy import select, union_all, text
+from sqlalchemy.orm import Session, aliased
+
+from .db import engine
+from .models import Flete, FleteArchivado
+
+# Sólo se archivan viajes concluidos
+ARCHIVE_ESTADO = "viajes concretados"
+BATCH_SIZE = 5000
+
+_COLS = [c.name for c in Flete.__table__.columns]
+
+
+def fletes_source(include_archived: bool = False):
+    """
+    Entidad a consultar: Flete, o Flete + fletes_archivo (UNION ALL) mapeado
+    como Flete, así las queries existentes no cambian.
+    """
+    if not include_archived:
+        return Flete
+    hot = select(*Flete.__table__.columns)
+    cold = select(*[FleteArchivado.__table__.c[name] for name in _COLS])
+    return aliased(Flete, union_all(hot, cold).subquery("fletes_all"), name="fletes_all")
+
+
+def months_ago(meses: int, hoy: date | None = None) -> date:
+    """Primer día del mes, "meses" meses atrás."""
+    hoy = hoy or date.today()
+    total = hoy.year * 12 + (hoy.month - 1) - meses
+    return date(total // 12, total % 12 + 1, 1)
+
+
+def archive_concluded(db: Session, antes_de: date, batch_size: int = BATCH_SIZE) -> int:
+    """
+    Mueve a fletes_archivo los "viajes concretados" con fecha < antes_de,
+    en lotes (cada lote es DELETE ... RETURNING + INSERT en una sola sentencia).
+    """
+    cols = ", ".join(_COLS)
+    moved = 0
+    while True:
+        # Con "fletes" particionado, el trigger de fletes_o_carga deja registradas
+        # las claves archivadas (ver partitions.py). SET LOCAL: dura sólo este lote.
+        db.execute(text("SELECT set_config('fletes.archivando', 'on', true)"))
+        n = db.execute(text(f"""
+            WITH moved AS (
+                DELETE FROM fletes
+                WHERE id IN (
+                    SELECT id FROM fletes
+                    WHERE estado = :estado AND fecha < :antes_de
+                    LIMIT :batch
+                )
+                RETURNING {cols}
+            )
+            INSERT INTO fletes_archivo ({cols})
+            SELECT {cols} FROM moved
+        """), {"estado": ARCHIVE_ESTADO, "antes_de": antes_de, "batch": batch_size}).rowcount
+        db.commit()
+        moved += n
+        if n < batch_size:
+            break
+
+    if moved:
+        # Deja reutilizable el espacio liberado en fletes y sus índices
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text("VACUUM (ANALYZE) fletes;"))
+
+    return moved
@@ -0,0 +1,8 @@
+"""
+Benchmarks de import / export / listado / analytics.
+
+    python -m app.bench.run --rows 10k                 # smoke: SQLite temporal
+    python -m app.bench.run --rows 100k --database-url postgresql+psycopg2://...
+
+Ver "python -m app.bench.run --help".
+"""
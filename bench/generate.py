@@ -0,0 +1,214 @@
+"""
+Datos sintéticos tipo FLETES: workbook con las 4 hojas que procesa
+/import-excel (con variantes de encabezados) y seed directo a la DB.
+Todo es determinístico a partir de "seed".
+"""
+import random
+import shutil
+import zipfile
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from io import BytesIO
+
+import openpyxl
+from openpyxl.utils import get_column_letter
+
+# Hoja -> estado (igual que import_excel); el peso es la proporción de filas
+SHEETS = [
+    ("transporte", "transporte", 0.08),
+    ("viajes en camino", "viajes en camino", 0.07),
+    ("viajes concretados", "viajes concretados", 0.60),
+    ("base datos", "viajes concretados", 0.25),
+]
+
+# Variantes de encabezados que aparecen en las planillas reales (ver EXPECTED_COLS)
+HEADER_VARIANTS = {
+    "fecha": ["FECHA", "Fecha"],
+    "dia": ["Día", "DIA"],
+    "o_carga": ["O.Carga", "O CARGA", "O. CARGA"],
+    "anio_mes": ["AÑO.MES", "ANO MES", "Año/Mes"],
+    "cliente_destino": ["CLIENTE / DESTINO", "CLIENTE DESTINO", "Cliente - Destino"],
+    "transportista": ["TRANSPORTISTA", "Transportista"],
+    "cod_transporte": ["Cod. Transporte", "COD TRANSPORTE"],
+    "ingrese_transporte": ["INGRESE TRANSPORTE"],
+    "km": ["KM", "Km"],
+    "tn_orden_carga": ["TN ORDEN DE CARGA", "TN ORDEN CARGA"],
+    "tn_cargadas": ["TN CARGADAS"],
+    "aforo": ["AFORO"],
+    "tarifa_asign": ["TARIFA ASIGN", "Tarifa Asign."],
+    "flete_cobrado": ["FLETE COBRADO"],
+    "tarifa_tte": ["TARIFA TTE.", "TARIFA TTE"],
+    "flete_pagado": ["FLETE PAGADO"],
+    "diferencia": ["DIFERENCIA"],
+    "observacion": ["OBSERVACION", "OBSERVACIÓN", "Observación"],
+}
+
+DIAS = ["lunes", "martes", "miércoles", "jueves", "viernes", "sábado", "domingo"]
+CIUDADES = ["ROSARIO", "CÓRDOBA", "SANTA FE", "PARANÁ", "RAFAELA", "VENADO TUERTO", "JUNÍN", "PERGAMINO"]
+HISTORY_DAYS = 3 * 365
+
+TIERS = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+
+
+def transportistas(n: int = 80) -> list[str]:
+    return [f"TRANSPORTES {i:03d} S.R.L." for i in range(1, n + 1)]
+
+
+def destinos(n: int = 300) -> list[str]:
+    rng = random.Random(7)
+    return [f"CLIENTE {i:03d} / {rng.choice(CIUDADES)}" for i in range(1, n + 1)]
+
+
+def iter_fletes(rows: int, seed: int = 1234, hoy: date | None = None):
+    """
+    Filas con valores ya "parseados" (date / Decimal / str) + "sheet".
+    o_carga es único en todo el set.
+    """
+    rng = random.Random(seed)
+    hoy = hoy or date(2026, 1, 1)
+    trans = transportistas()
+    dest = destinos()
+    sheet_names = [s[0] for s in SHEETS]
+    weights = [s[2] for s in SHEETS]
+    estados = {s[0]: s[1] for s in SHEETS}
+
+    for i in range(rows):
+        sheet = rng.choices(sheet_names, weights)[0]
+        fecha = hoy - timedelta(days=rng.randrange(HISTORY_DAYS))
+        km = Decimal(rng.randrange(20, 1200))
+        tn_orden = Decimal(rng.randrange(20000, 32000)) / 1000
+        tn_carg = tn_orden - Decimal(rng.randrange(0, 1500)) / 1000
+        tarifa_asign = Decimal(rng.randrange(8000, 40000)) / 100
+        tarifa_tte = (tarifa_asign * Decimal(rng.uniform(0.80, 0.95))).quantize(Decimal("0.01"))
+        yield {
+            "sheet": sheet,
+            "estado": estados[sheet],
+            "fecha": fecha,
+            "dia": DIAS[fecha.weekday()],
+            "o_carga": f"OC{i + 1:08d}",
+            "cliente_destino": rng.choice(dest),
+            "transportista": rng.choice(trans),
+            "cod_transporte": f"T{rng.randrange(1, 500):04d}",
+            "ingrese_transporte": f"CAMIÓN {rng.choice('ABCDEFGH')}{rng.randrange(100, 999)}",
+            "km": km,
+            "tn_orden_carga": tn_orden,
+            "tn_cargadas": tn_carg,
+            "aforo": Decimal(rng.randrange(0, 500)) / 1000,
+            "tarifa_asign": tarifa_asign,
+            "flete_cobrado": (tarifa_asign * tn_carg).quantize(Decimal("0.01")),
+            "tarifa_tte": tarifa_tte,
+            "flete_pagado": (tarifa_tte * tn_carg).quantize(Decimal("0.01")),
+            "observacion": rng.choice([None, None, None, "demora en carga", "reprogramado", "sin novedad"]),
+        }
+
+
+def _fmt_number(rng: random.Random, v: Decimal):
+    # 80% número, 20% texto con formato argentino (1.234,56)
+    if rng.random() < 0.8:
+        return float(v)
+    entero, _, dec = f"{v:.2f}".partition(".")
+    entero = f"{int(entero):,}".replace(",", ".")
+    return f"{entero},{dec}"
+
+
+def _fmt_fecha(rng: random.Random, d: date):
+    # 70% celda fecha, 30% texto dd/mm/aaaa
+    if rng.random() < 0.7:
+        return datetime(d.year, d.month, d.day)
+    return d.strftime("%d/%m/%Y")
+
+
+def build_workbook(rows: int, seed: int = 1234) -> bytes:
+    """Workbook .xlsx como los que se suben a /import-excel."""
+    rng = random.Random(seed + 1)
+    wb = openpyxl.Workbook(write_only=True)
+
+    fields = list(HEADER_VARIANTS)
+    sheets = {}
+    for sheet, _, _ in SHEETS:
+        # Nombres de hoja con mayúsculas / espacios como en las planillas reales
+        ws = wb.create_sheet(title=rng.choice([sheet, sheet.upper(), sheet.title(), f" {sheet}"]))
+        ws.append(["FLETES COBRADOS / PAGADOS"])
+        ws.append([])
+        ws.append([rng.choice(HEADER_VARIANTS[f]) for f in fields])
+        sheets[sheet] = ws
+
+    counts = {sheet: 0 for sheet, _, _ in SHEETS}
+    numeric = {"km", "tn_orden_carga", "tn_cargadas", "aforo", "tarifa_asign", "flete_cobrado", "tarifa_tte", "flete_pagado"}
+    for row in iter_fletes(rows, seed):
+        out = []
+        for f in fields:
+            if f == "fecha":
+                out.append(_fmt_fecha(rng, row["fecha"]))
+            elif f == "anio_mes":
+                out.append(int(f"{row['fecha']:%Y%m}"))
+            elif f == "diferencia":
+                out.append(float(row["flete_cobrado"] - row["flete_pagado"]))
+            elif f in numeric:
+                out.append(_fmt_number(rng, row[f]))
+            else:
+                out.append(row[f])
+        sheets[row["sheet"]].append(out)
+        counts[row["sheet"]] += 1
+
+    output = BytesIO()
+    wb.save(output)
+    last_col = get_column_letter(len(fields))
+    return _add_dimensions(output.getvalue(), [f"A1:{last_col}{3 + counts[s[0]]}" for s in SHEETS])
+
+
+def _add_dimensions(content: bytes, refs: list[str]) -> bytes:
+    """
+    El modo write_only de openpyxl no escribe <dimension> y entonces en
+    read_only ws.max_row es None; Excel siempre lo escribe, así que se agrega.
+    """
+    src = zipfile.ZipFile(BytesIO(content))
+    output = BytesIO()
+    with zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED) as dst:
+        for info in src.infolist():
+            with src.open(info) as fin, dst.open(info.filename, "w", force_zip64=True) as fout:
+                name = info.filename
+                if name.startswith("xl/worksheets/sheet") and name.endswith(".xml"):
+                    idx = int(name[len("xl/worksheets/sheet"):-len(".xml")]) - 1
+                    head = fin.read(4096)
+                    head = head.replace(b"</sheetPr>", f'</sheetPr><dimension ref="{refs[idx]}" />'.encode(), 1)
+                    fout.write(head)
+                shutil.copyfileobj(fin, fout)
+    return output.getvalue()
+
+
+def seed_db(rows: int, seed: int = 1234, batch_size: int = 5000) -> int:
+    """Carga "rows" fletes directo a la DB (sin pasar por el import)."""
+    from sqlalchemy import insert, select
+
+    from ..db import SessionLocal
+    from ..models import Transportista, Flete
+    from ..partitions import ensure_partition
+
+    db = SessionLocal()
+    try:
+        db.execute(insert(Transportista), [{"nombre": n} for n in transportistas()])
+        tmap = dict(db.execute(select(Transportista.nombre, Transportista.id)).all())
+
+        batch = []
+        meses = set()
+        for row in iter_fletes(rows, seed):
+            mes = row["fecha"].replace(day=1)
+            if mes not in meses:
+                # La partición se crea en otra conexión: soltamos los locks de este lote
+                db.commit()
+                ensure_partition(row["fecha"])
+                meses.add(mes)
+            row = dict(row)
+            row.pop("sheet")
+            row["transportista_id"] = tmap[row.pop("transportista")]
+            batch.append(row)
+            if len(batch) >= batch_size:
+                db.execute(insert(Flete), batch)
+                batch = []
+        if batch:
+            db.execute(insert(Flete), batch)
+        db.commit()
+    finally:
+        db.close()
+    return rows
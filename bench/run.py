@@ -0,0 +1,245 @@
+"""
+Corre los escenarios (import_excel, export_excel, listar_fletes, analytics),
+guarda throughput / p50 / p99 / memoria pico en JSON y compara contra un
+baseline.
+
+Ojo: con --database-url la DB se vacía (TRUNCATE) entre escenarios.
+Sin --database-url usa una SQLite temporal (tier smoke).
+"""
+import argparse
+import itertools
+import json
+import math
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from .generate import HEADER_VARIANTS, TIERS, build_workbook, seed_db
+
+SCENARIOS = ("import_excel", "export_excel", "listar_fletes", "analytics")
+
+# Métricas donde "más" es peor / "menos" es peor
+HIGHER_IS_WORSE = ("p50_ms", "p99_ms", "peak_mem_mb")
+LOWER_IS_WORSE = ("throughput",)
+
+
+def percentile(samples: list[float], p: float) -> float:
+    """Percentil por nearest-rank (p en 0..100)."""
+    s = sorted(samples)
+    k = max(0, math.ceil(p / 100 * len(s)) - 1)
+    return s[k]
+
+
+def reset_db():
+    from sqlalchemy import delete, text
+
+    from ..db import engine
+    from ..models import Flete, FleteArchivado, Transportista
+
+    with engine.begin() as conn:
+        if engine.dialect.name == "postgresql":
+            tables = "fletes, fletes_archivo, transportistas"
+            if conn.execute(text("SELECT to_regclass('fletes_o_carga')")).scalar():
+                tables += ", fletes_o_carga"
+            conn.execute(text(f"TRUNCATE {tables} RESTART IDENTITY CASCADE;"))
+        else:
+            for model in (Flete, FleteArchivado, Transportista):
+                conn.execute(delete(model))
+
+
+def measure(fn, repeat: int, before=None) -> dict:
+    """
+    Corre fn() "repeat" veces (latencias) y una vez más con tracemalloc
+    (memoria pico de Python; las latencias no incluyen el overhead de tracemalloc).
+    """
+    samples = []
+    for _ in range(repeat):
+        if before:
+            before()
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+
+    if before:
+        before()
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "n": repeat,
+        "p50_ms": round(percentile(samples, 50), 2),
+        "p99_ms": round(percentile(samples, 99), 2),
+        "peak_mem_mb": round(peak / 1024 / 1024, 2),
+    }
+
+
+def run(rows: int, repeat: int, seed: int, scenarios: list[str]) -> dict:
+    from fastapi.testclient import TestClient
+
+    from ..main import app
+    from ..parsing import _norm, EXPECTED_COLS
+
+    # Si cambia EXPECTED_COLS, que el generador no quede desfasado en silencio
+    for field, variants in HEADER_VARIANTS.items():
+        for v in variants:
+            if EXPECTED_COLS.get(_norm(v)) != field and field != "cliente_destino":
+                raise SystemExit(f"Encabezado del generador no reconocido por el import: {v!r}")
+
+    client = TestClient(app)
+    results = {}
+
+    def check(res):
+        if res.status_code != 200:
+            raise SystemExit(f"{res.request.method} {res.request.url} -> {res.status_code}: {res.text[:300]}")
+        return res
+
+    if "import_excel" in scenarios:
+        content = build_workbook(rows, seed)
+
+        def do_import():
+            res = check(client.post(
+                "/import-excel",
+                files={"file": ("FLETES.xlsx", content, "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")},
+            ))
+            if res.json()["inserted"] != rows:
+                raise SystemExit(f"import_excel insertó {res.json()['inserted']} de {rows}")
+
+        r = measure(do_import, repeat, before=reset_db)
+        r["throughput"] = round(rows / (r["p50_ms"] / 1000), 1)
+        r["unit"] = "rows/s"
+        results["import_excel"] = r
+
+    # Escenarios de lectura sobre una DB sembrada
+    reset_db()
+    seed_db(rows, seed)
+
+    if "export_excel" in scenarios:
+        r = measure(lambda: check(client.get("/export-excel")), repeat)
+        r["throughput"] = round(rows / (r["p50_ms"] / 1000), 1)
+        r["unit"] = "rows/s"
+        results["export_excel"] = r
+
+    if "listar_fletes" in scenarios:
+        variants = [
+            {},
+            {"estado": "transporte"},
+            {"estado": "viajes concretados", "limit": 2000},
+            {"anio_mes": "202506"},
+            {"transportista_id": 7},
+            {"q": "CLIENTE 01"},
+            {"desde": "2025-01-01", "hasta": "2025-03-31", "offset": 200},
+        ]
+        params = itertools.cycle(variants)
+        r = measure(lambda: check(client.get("/fletes", params=next(params))), repeat * len(variants))
+        r["throughput"] = round(1000 / r["p50_ms"], 1)
+        r["unit"] = "req/s"
+        results["listar_fletes"] = r
+
+    if "analytics" in scenarios:
+        r = measure(lambda: check(client.get("/analytics")), repeat)
+        r["throughput"] = round(1000 / r["p50_ms"], 1)
+        r["unit"] = "req/s"
+        results["analytics"] = r
+
+    return results
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Regresiones de current vs baseline (mismo escenario, peor por más de "tolerance")."""
+    regressions = []
+    for name, cur in current["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name)
+        if not base:
+            continue
+        for k in HIGHER_IS_WORSE:
+            if base.get(k) and cur[k] > base[k] * (1 + tolerance):
+                regressions.append(f"{name}.{k}: {base[k]} -> {cur[k]} (+{(cur[k] / base[k] - 1) * 100:.1f}%)")
+        for k in LOWER_IS_WORSE:
+            if base.get(k) and cur[k] < base[k] * (1 - tolerance):
+                regressions.append(f"{name}.{k}: {base[k]} -> {cur[k]} ({(cur[k] / base[k] - 1) * 100:.1f}%)")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.bench.run", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", choices=sorted(TIERS), default="10k")
+    parser.add_argument("--database-url", help="Postgres a usar (se vacía!). Default: SQLite temporal")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--out", default="bench_results.json")
+    parser.add_argument("--baseline", help="JSON de una corrida anterior para comparar")
+    parser.add_argument("--tolerance", type=float, default=0.15)
+    args = parser.parse_args(argv)
+
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"escenarios desconocidos: {sorted(unknown)}")
+
+    # DATABASE_URL se lee al importar db.py: hay que setearlo antes de importar la app
+    tmpdir = None
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    else:
+        tmpdir = tempfile.TemporaryDirectory()
+        os.environ["DATABASE_URL"] = f"sqlite:///{tmpdir.name}/bench.db"
+
+    rows = TIERS[args.rows]
+    started = datetime.now(timezone.utc)
+    scenario_results = run(rows, args.repeat, args.seed, scenarios)
+
+    from ..db import engine
+
+    current = {
+        "meta": {
+            "rows": rows,
+            "tier": args.rows,
+            "dialect": engine.dialect.name,
+            "seed": args.seed,
+            "repeat": args.repeat,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "started_at": started.isoformat(),
+        },
+        "scenarios": scenario_results,
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(current, f, indent=2)
+
+    for name, r in scenario_results.items():
+        print(f"{name:15s} p50={r['p50_ms']:>10.2f}ms p99={r['p99_ms']:>10.2f}ms "
+              f"{r['throughput']:>12.1f} {r['unit']:7s} peak={r['peak_mem_mb']:.1f}MB")
+    print(f"-> {args.out}")
+
+    status = 0
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if (baseline.get("meta", {}).get("rows"), baseline.get("meta", {}).get("dialect")) != (rows, engine.dialect.name):
+            print("Aviso: el baseline es de otro tier / motor de DB, la comparación no es representativa")
+        regressions = compare(current, baseline, args.tolerance)
+        for line in regressions:
+            print(f"REGRESIÓN {line}")
+        if regressions:
+            status = 1
+        else:
+            print(f"Sin regresiones vs {args.baseline} (tolerancia {args.tolerance:.0%})")
+
+    if tmpdir:
+        engine.dispose()
+        tmpdir.cleanup()
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+import hashlib
+from datetime import timezone
+from email.utils import format_datetime
+
+from fastapi import Request, Response
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from .models import DataVersion
+
+# Versión de datos: una fila que suben los triggers de fletes / fletes_archivo / transportistas
+DATA_VERSION_TABLES = ("fletes", "fletes_archivo", "transportistas")
+
+
+def ensure_data_version(conn):
+    # La tabla la crea create_all (models.DataVersion); acá la fila y los triggers
+    conn.execute(text("""
+        INSERT INTO data_version (id, version) VALUES (1, 1)
+        ON CONFLICT (id) DO NOTHING;
+    """))
+    # Una sola suba por transacción y recién al commit (trigger diferido): el lock
+    # de la fila de data_version dura sólo el commit, no toda la transacción.
+    # "data_version.bumped" es local a la transacción (set_config(..., true)).
+    conn.execute(text("""
+        CREATE OR REPLACE FUNCTION data_version_bump() RETURNS trigger AS $$
+        BEGIN
+            IF current_setting('data_version.bumped', true) = 'on' THEN
+                RETURN NULL;
+            END IF;
+            PERFORM set_config('data_version.bumped', 'on', true);
+            UPDATE data_version SET version = version + 1, updated_at = now() WHERE id = 1;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """))
+    for table in DATA_VERSION_TABLES:
+        conn.execute(text(f"DROP TRIGGER IF EXISTS tr_{table}_data_version ON {table};"))
+        conn.execute(text(f"DROP TRIGGER IF EXISTS tr_{table}_data_version_truncate ON {table};"))
+        conn.execute(text(f"""
+            CREATE CONSTRAINT TRIGGER tr_{table}_data_version
+            AFTER INSERT OR UPDATE OR DELETE ON {table}
+            DEFERRABLE INITIALLY DEFERRED
+            FOR EACH ROW EXECUTE FUNCTION data_version_bump();
+        """))
+        # TRUNCATE no admite triggers diferidos (es raro: acá va directo)
+        conn.execute(text(f"""
+            CREATE TRIGGER tr_{table}_data_version_truncate
+            AFTER TRUNCATE ON {table}
+            FOR EACH STATEMENT EXECUTE FUNCTION data_version_bump();
+        """))
+
+
+def check_not_modified(request: Request, response: Response, db: Session):
+    """
+    Setea ETag / Last-Modified en "response" a partir de la versión de datos
+    y de la query. Si el cliente ya tiene esa versión devuelve un 304 listo
+    para retornar (sin consultar ni serializar nada más); si no, None.
+    Sin fila de versión (ej. SQLite sin triggers) no hay validadores.
+    """
+    dv = db.get(DataVersion, 1)
+    if dv is None:
+        return None
+    version, updated_at = dv.version, dv.updated_at
+    if updated_at.tzinfo is None:
+        updated_at = updated_at.replace(tzinfo=timezone.utc)
+
+    key = request.url.path + "?" + "&".join(sorted(f"{k}={v}" for k, v in request.query_params.multi_items()))
+    etag = f'W/"{version}-{hashlib.md5(key.encode()).hexdigest()[:16]}"'
+    updated_at = updated_at.astimezone(timezone.utc).replace(microsecond=0)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": format_datetime(updated_at, usegmt=True),
+        "Cache-Control": "no-cache",
+    }
+    response.headers.update(headers)
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        tags = [t.strip() for t in if_none_match.split(",")]
+        if etag in tags or "*" in tags:
+            return Response(status_code=304, headers=headers)
+
+    # If-Modified-Since no da 304: Last-Modified va truncado al segundo y sale
+    # de now() (inicio de la transacción), así que otra escritura en el mismo
+    # segundo, o una transacción larga, quedaría tapada. Sólo valida el ETag.
+    return None
@@ -0,0 +1,98 @@
+import asyncio
+import json
+import threading
+from datetime import date, datetime
+from decimal import Decimal
+
+from fastapi import Request
+
+# Cada cliente SSE tiene su cola; si un cliente no lee, se descartan sus eventos viejos
+QUEUE_SIZE = 200
+KEEPALIVE_SECONDS = 15
+
+
+def _json_default(v):
+    if isinstance(v, Decimal):
+        return float(v)
+    if isinstance(v, (date, datetime)):
+        return v.isoformat()
+    raise TypeError(f"No serializable: {type(v)}")
+
+
+class Broadcaster:
+    """
+    Broadcaster en memoria para el feed /events.
+    publish() se puede llamar desde los endpoints sync (threadpool): cada
+    mensaje se encola en el event loop de cada suscriptor.
+    """
+
+    def __init__(self):
+        self._subs: set[tuple[asyncio.AbstractEventLoop, asyncio.Queue]] = set()
+        self._lock = threading.Lock()
+        self._seq = 0
+
+    def subscribe(self):
+        sub = (asyncio.get_running_loop(), asyncio.Queue(maxsize=QUEUE_SIZE))
+        with self._lock:
+            self._subs.add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subs.discard(sub)
+
+    @staticmethod
+    def _put(queue: asyncio.Queue, msg: str):
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(msg)
+
+    def publish(self, tipo: str, data: dict):
+        with self._lock:
+            self._seq += 1
+            msg = f"id: {self._seq}\nevent: {tipo}\ndata: {json.dumps(data, default=_json_default)}\n\n"
+            subs = list(self._subs)
+        for loop, queue in subs:
+            try:
+                loop.call_soon_threadsafe(self._put, queue, msg)
+            except RuntimeError:
+                # loop cerrado (cliente que se fue)
+                self.unsubscribe((loop, queue))
+
+    async def stream(self, request: Request):
+        sub = self.subscribe()
+        _, queue = sub
+        try:
+            yield "retry: 3000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    yield await asyncio.wait_for(queue.get(), timeout=KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+        finally:
+            self.unsubscribe(sub)
+
+
+broadcaster = Broadcaster()
+
+
+def delta(cobrado, pagado, cantidad: int = 1) -> dict:
+    """
+    Delta de agregados (lo mismo que suma /analytics) para que el cliente lo
+    aplique sin re-pedir todo. cantidad=-1 resta la fila.
+    """
+    cobrado = (cobrado or Decimal("0")) * cantidad
+    pagado = (pagado or Decimal("0")) * cantidad
+    return {
+        "cantidad": cantidad,
+        "cobrado": cobrado,
+        "pagado": pagado,
+        "diferencia": cobrado - pagado,
+    }
+
+
+def add_delta(acc: dict, key, d: dict):
+    """Acumula el delta "d" en acc[key] (para eventos agregados, ej. import)."""
+    cur = acc.setdefault(key, {"cantidad": 0, "cobrado": Decimal("0"), "pagado": Decimal("0"), "diferencia": Decimal("0")})
+    for k, v in d.items():
+        cur[k] += v
@@ -0,0 +1,267 @@
+"""
+Liquidación a transportistas: totales, desvíos de tarifa y viajes por
+transportista para un rango de fechas, calculados en la DB.
+
+- tarifa efectiva = flete_pagado / tn_cargadas
+- desvío = flete_pagado - tarifa_tte * tn_cargadas (lo pagado de más / de menos)
+- desvío % = (tarifa efectiva - tarifa_tte) / tarifa_tte * 100
+"""
+import csv
+import io
+import re
+from datetime import date
+from itertools import groupby
+
+import openpyxl
+from sqlalchemy import select, func, case
+from sqlalchemy.orm import Session
+
+from .archive import fletes_source
+from .db import SessionLocal
+from .models import Transportista
+
+# Desvío de tarifa (en %) a partir del cual se marca el viaje
+TOLERANCIA_PCT = 1.0
+# Filas por lote al recorrer los viajes (cursor del lado del servidor en Postgres)
+YIELD_PER = 2000
+
+VIAJE_HEADERS = [
+    "FECHA",
+    "O.Carga",
+    "CLIENTE / DESTINO",
+    "ESTADO",
+    "KM",
+    "TN CARGADAS",
+    "TARIFA TTE.",
+    "TARIFA EFECTIVA",
+    "FLETE PAGADO",
+    "DESVÍO",
+    "DESVÍO %",
+]
+
+TOTALES_HEADERS = [
+    "TRANSPORTISTA",
+    "VIAJES",
+    "KM",
+    "TN CARGADAS",
+    "FLETE PAGADO",
+    "TARIFA EFECTIVA",
+    "DESVÍO",
+    "VIAJES CON DESVÍO",
+    "VIAJES SIN TARIFA",
+]
+
+
+def _viaje_exprs(F):
+    tarifa_efectiva = F.flete_pagado / func.nullif(F.tn_cargadas, 0)
+    desvio = F.flete_pagado - F.tarifa_tte * F.tn_cargadas
+    desvio_pct = (tarifa_efectiva - F.tarifa_tte) / func.nullif(F.tarifa_tte, 0) * 100
+    return tarifa_efectiva, desvio, desvio_pct
+
+
+def _conds(F, desde: date | None, hasta: date | None, transportista_id: int | None):
+    conds = []
+    if desde:
+        conds.append(F.fecha >= desde)
+    if hasta:
+        conds.append(F.fecha <= hasta)
+    if transportista_id:
+        conds.append(F.transportista_id == transportista_id)
+    return conds
+
+
+def totales(
+    db: Session,
+    desde: date | None = None,
+    hasta: date | None = None,
+    transportista_id: int | None = None,
+    tolerancia: float = TOLERANCIA_PCT,
+    include_archived: bool = True,
+) -> list[dict]:
+    """Una fila por transportista con viajes en el rango (GROUP BY en la DB)."""
+    F = fletes_source(include_archived)
+    _, desvio, desvio_pct = _viaje_exprs(F)
+
+    rows = db.execute(
+        select(
+            Transportista.id.label("transportista_id"),
+            Transportista.nombre.label("transportista"),
+            func.count(F.id).label("viajes"),
+            func.coalesce(func.sum(F.km), 0).label("km"),
+            func.coalesce(func.sum(F.tn_cargadas), 0).label("tn_cargadas"),
+            func.coalesce(func.sum(F.flete_pagado), 0).label("flete_pagado"),
+            func.round(func.sum(F.flete_pagado) / func.nullif(func.sum(F.tn_cargadas), 0), 2).label("tarifa_efectiva"),
+            func.coalesce(func.round(func.sum(desvio), 2), 0).label("desvio"),
+            func.count(case((func.abs(desvio_pct) > tolerancia, 1))).label("viajes_con_desvio"),
+            func.count(case((F.tarifa_tte.is_(None), 1))).label("viajes_sin_tarifa"),
+        )
+        .join(Transportista, Transportista.id == F.transportista_id)
+        .where(*_conds(F, desde, hasta, transportista_id))
+        .group_by(Transportista.id, Transportista.nombre)
+        .order_by(Transportista.nombre.asc())
+    ).all()
+    return [dict(r._mapping) for r in rows]
+
+
+def sin_viajes(t: Transportista) -> dict:
+    """Totales en cero para un transportista sin viajes en el rango."""
+    return {
+        "transportista_id": t.id,
+        "transportista": t.nombre,
+        "viajes": 0,
+        "km": 0,
+        "tn_cargadas": 0,
+        "flete_pagado": 0,
+        "tarifa_efectiva": None,
+        "desvio": 0,
+        "viajes_con_desvio": 0,
+        "viajes_sin_tarifa": 0,
+    }
+
+
+def viajes(
+    db: Session,
+    desde: date | None = None,
+    hasta: date | None = None,
+    transportista_id: int | None = None,
+    include_archived: bool = True,
+):
+    """
+    Viajes del rango, ordenados por transportista (mismo orden que totales())
+    y fecha, con la tarifa efectiva y el desvío. Se recorren de a YIELD_PER.
+    """
+    F = fletes_source(include_archived)
+    tarifa_efectiva, desvio, desvio_pct = _viaje_exprs(F)
+
+    return db.execute(
+        select(
+            F.transportista_id,
+            F.fecha,
+            F.o_carga,
+            F.cliente_destino,
+            F.estado,
+            F.km,
+            F.tn_cargadas,
+            F.tarifa_tte,
+            func.round(tarifa_efectiva, 2).label("tarifa_efectiva"),
+            F.flete_pagado,
+            func.round(desvio, 2).label("desvio"),
+            func.round(desvio_pct, 2).label("desvio_pct"),
+        )
+        .join(Transportista, Transportista.id == F.transportista_id)
+        .where(*_conds(F, desde, hasta, transportista_id))
+        .order_by(Transportista.nombre.asc(), F.fecha.asc().nullslast(), F.o_carga.asc())
+        .execution_options(yield_per=YIELD_PER)
+    )
+
+
+def _num(x):
+    return float(x) if x is not None else None
+
+
+def _viaje_row(v) -> list:
+    return [
+        v.fecha,
+        v.o_carga,
+        v.cliente_destino,
+        v.estado,
+        _num(v.km),
+        _num(v.tn_cargadas),
+        _num(v.tarifa_tte),
+        _num(v.tarifa_efectiva),
+        _num(v.flete_pagado),
+        _num(v.desvio),
+        _num(v.desvio_pct),
+    ]
+
+
+def _totales_row(t: dict) -> list:
+    return [
+        t["transportista"],
+        t["viajes"],
+        _num(t["km"]),
+        _num(t["tn_cargadas"]),
+        _num(t["flete_pagado"]),
+        _num(t["tarifa_efectiva"]),
+        _num(t["desvio"]),
+        t["viajes_con_desvio"],
+        t["viajes_sin_tarifa"],
+    ]
+
+
+def _sheet_title(nombre: str, used: set) -> str:
+    # Excel: máx. 31 caracteres, sin []:*?/\ y sin repetir
+    base = re.sub(r"[\[\]:*?/\\]", " ", nombre).strip()[:31] or "Transportista"
+    title, n = base, 2
+    while title.lower() in used:
+        suffix = f" ({n})"
+        title = base[: 31 - len(suffix)] + suffix
+        n += 1
+    used.add(title.lower())
+    return title
+
+
+def build_xlsx(tots: list[dict], rows) -> io.BytesIO:
+    """
+    Hoja "Resumen" + una hoja por transportista. "rows" se consume una sola
+    vez, en el orden de viajes(); con write_only las filas no quedan en memoria.
+    """
+    wb = openpyxl.Workbook(write_only=True)
+
+    resumen = wb.create_sheet(title="Resumen")
+    resumen.append(TOTALES_HEADERS)
+    for t in tots:
+        resumen.append(_totales_row(t))
+
+    used = {"resumen"}
+    # Un viaje cargado entre la query de totales y esta (otro transportista)
+    # no tiene hoja: se saltea su grupo para no desalinear el resto
+    ids = {t["transportista_id"] for t in tots}
+    grupos = ((tid, vs) for tid, vs in groupby(rows, key=lambda v: v.transportista_id) if tid in ids)
+    grupo = next(grupos, None)
+
+    for t in tots:
+        ws = wb.create_sheet(title=_sheet_title(t["transportista"], used))
+        ws.append(VIAJE_HEADERS)
+        if grupo is not None and grupo[0] == t["transportista_id"]:
+            for v in grupo[1]:
+                ws.append(_viaje_row(v))
+            grupo = next(grupos, None)
+        ws.append([])
+        ws.append(["TOTAL", None, None, None, _num(t["km"]), _num(t["tn_cargadas"]), None,
+                   _num(t["tarifa_efectiva"]), _num(t["flete_pagado"]), _num(t["desvio"]), None])
+
+    output = io.BytesIO()
+    wb.save(output)
+    output.seek(0)
+    return output
+
+
+def iter_csv(
+    tots: list[dict],
+    desde: date | None = None,
+    hasta: date | None = None,
+    transportista_id: int | None = None,
+    include_archived: bool = True,
+    chunk_size: int = 1000,
+):
+    """
+    CSV (una fila por viaje, con el transportista) en bloques de texto, a
+    medida que llegan de la DB. Usa su propia sesión: el generador corre
+    cuando la sesión del request ya se cerró.
+    """
+    nombres = {t["transportista_id"]: t["transportista"] for t in tots}
+    buf = io.StringIO()
+    w = csv.writer(buf)
+
+    # BOM para que Excel lo abra como UTF-8
+    buf.write("\ufeff")
+    w.writerow(["TRANSPORTISTA", *VIAJE_HEADERS])
+    with SessionLocal() as db:
+        for i, v in enumerate(viajes(db, desde, hasta, transportista_id, include_archived), 1):
+            w.writerow([nombres.get(v.transportista_id, ""), *_viaje_row(v)])
+            if i % chunk_size == 0:
+                yield buf.getvalue()
+                buf.seek(0)
+                buf.truncate()
+    yield buf.getvalue()
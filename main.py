@@ -1,19 +1,42 @@
-from fastapi import FastAPI, Depends, HTTPException, UploadFile, File
-from fastapi.responses import StreamingResponse
+from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Header, Request, Response
+from fastapi.responses import StreamingResponse, PlainTextResponse
+from fastapi.middleware.gzip import GZipMiddleware
 from sqlalchemy.orm import Session
 from sqlalchemy import select, text
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy import func
 
 from io import BytesIO
-from datetime import datetime, date
-from decimal import Decimal, InvalidOperation
+from urllib.parse import parse_qs
+from datetime import date
+from decimal import Decimal
 import openpyxl
 import re
-import unicodedata
 
 from .db import SessionLocal, engine, Base
-from .models import Transportista, Flete
+from .models import Transportista, Flete, FleteArchivado
+from .partitions import ensure_partitioned_fletes, ensure_partition, missing_partitions, create_partitions, month_range
+from .archive import fletes_source, months_ago, archive_concluded
+from .events import broadcaster, delta, add_delta
+from .conditional import ensure_data_version, check_not_modified
+from .metrics import MetricsMiddleware, StageTimer, registry
+from .liquidacion import (
+    TOLERANCIA_PCT,
+    totales as liquidacion_totales,
+    viajes as liquidacion_viajes,
+    sin_viajes as liquidacion_sin_viajes,
+    build_xlsx,
+    iter_csv,
+)
+from .parsing import (
+    _find_header_row_and_map,
+    COLUMN_KINDS,
+    ColumnParser,
+    _oc_text,
+    read_data_rows,
+    column,
+)
 from .schemas import (
     TransportistaCreate,
     TransportistaOut,
@@ -21,6 +44,12 @@ from .schemas import (
     FleteOut,
 )
 
+try:
+    # Opcional: brotli (pip install brotli-asgi), si no está se usa gzip
+    from brotli_asgi import BrotliMiddleware
+except ImportError:
+    BrotliMiddleware = None
+
 app = FastAPI(title="Logística Conecar API")
 app.add_middleware(
     CORSMiddleware,
@@ -30,9 +59,50 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+class CompressionMiddleware:
+    """
+    Brotli/gzip para respuestas grandes de JSON / texto. No toca el stream
+    SSE (/events) ni los .xlsx (ya son ZIP: sólo gastaría CPU).
+    """
+
+    COMPRESSED_PATHS = {"/fletes", "/transportistas", "/analytics", "/metrics"}
+
+    def __init__(self, app, minimum_size: int = 1024):
+        self.app = app
+        if BrotliMiddleware is not None:
+            self.compressed = BrotliMiddleware(app, minimum_size=minimum_size, gzip_fallback=True)
+        else:
+            self.compressed = GZipMiddleware(app, minimum_size=minimum_size)
+
+    def _compressible(self, scope) -> bool:
+        path = scope["path"]
+        if path in self.COMPRESSED_PATHS:
+            return True
+        if path == "/liquidaciones" or path.endswith("/liquidacion"):
+            # Mismo default de "formato" que los endpoints: xlsx para todos, json por transportista
+            default = "xlsx" if path == "/liquidaciones" else "json"
+            formato = parse_qs(scope["query_string"].decode("latin-1")).get("formato", [default])[0]
+            return formato.strip().lower() != "xlsx"
+        return False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and self._compressible(scope):
+            await self.compressed(scope, receive, send)
+        else:
+            await self.app(scope, receive, send)
+
+
+app.add_middleware(CompressionMiddleware)
+# Va último = más afuera: mide también la compresión
+app.add_middleware(MetricsMiddleware)
+
 # Crea tablas (simple por ahora)
 Base.metadata.create_all(bind=engine)
 
+# Las migraciones de abajo son DDL de Postgres; con SQLite (ej. benchmarks smoke) alcanza create_all
+IS_POSTGRES = engine.dialect.name == "postgresql"
+
 # Asegura que exista la columna "estado" en fletes (sin romper tu DB actual)
 def ensure_estado_column():
     with engine.begin() as conn:
@@ -44,7 +114,73 @@ def ensure_estado_column():
             CREATE INDEX IF NOT EXISTS ix_fletes_estado ON fletes (estado);
         """))
 
-ensure_estado_column()
+if IS_POSTGRES:
+    ensure_estado_column()
+
+
+# Convierte "diferencia" y "anio_mes" en columnas generadas por Postgres
+# (en DBs viejas eran columnas comunes cargadas desde Python / Excel)
+def ensure_generated_columns():
+    with engine.begin() as conn:
+        conn.execute(text("""
+            DO $$
+            BEGIN
+                IF EXISTS (
+                    SELECT 1 FROM information_schema.columns
+                    WHERE table_name = 'fletes' AND column_name = 'diferencia'
+                      AND is_generated = 'NEVER'
+                ) THEN
+                    ALTER TABLE fletes DROP COLUMN diferencia;
+                END IF;
+                IF EXISTS (
+                    SELECT 1 FROM information_schema.columns
+                    WHERE table_name = 'fletes' AND column_name = 'anio_mes'
+                      AND is_generated = 'NEVER'
+                ) THEN
+                    ALTER TABLE fletes DROP COLUMN anio_mes;
+                END IF;
+            END $$;
+        """))
+        conn.execute(text("""
+            ALTER TABLE fletes
+            ADD COLUMN IF NOT EXISTS diferencia NUMERIC(12, 2)
+            GENERATED ALWAYS AS (COALESCE(flete_cobrado, 0) - COALESCE(flete_pagado, 0)) STORED;
+        """))
+        conn.execute(text("""
+            ALTER TABLE fletes
+            ADD COLUMN IF NOT EXISTS anio_mes VARCHAR(20)
+            GENERATED ALWAYS AS (
+                CAST(CAST(EXTRACT(YEAR FROM fecha) * 100 + EXTRACT(MONTH FROM fecha) AS INTEGER) AS VARCHAR(20))
+            ) STORED;
+        """))
+        conn.execute(text("""
+            CREATE INDEX IF NOT EXISTS ix_fletes_anio_mes
+            ON fletes (anio_mes) INCLUDE (flete_cobrado, flete_pagado, diferencia);
+        """))
+        conn.execute(text("""
+            CREATE INDEX IF NOT EXISTS ix_fletes_fecha ON fletes (fecha);
+        """))
+        conn.execute(text("""
+            CREATE INDEX IF NOT EXISTS ix_fletes_estado_fecha ON fletes (estado, fecha, o_carga);
+        """))
+        conn.execute(text("""
+            CREATE INDEX IF NOT EXISTS ix_fletes_transportista_fecha ON fletes (transportista_id, fecha);
+        """))
+        conn.execute(text("""
+            CREATE INDEX IF NOT EXISTS ix_fletes_fecha_id_desc ON fletes (fecha DESC NULLS LAST, id DESC);
+        """))
+
+if IS_POSTGRES:
+    ensure_generated_columns()
+
+# Particionado mensual de fletes (opcional, ver partitions.py)
+if IS_POSTGRES:
+    ensure_partitioned_fletes()
+
+# Versión de datos para ETag / Last-Modified (va después del particionado: recrea "fletes")
+if IS_POSTGRES:
+    with engine.begin() as conn:
+        ensure_data_version(conn)
 
 
 def get_db():
@@ -59,42 +195,95 @@ def get_db():
 def health():
     return {"ok": True}
 
+
+# Métricas en formato Prometheus (latencias, SQL por endpoint, etapas de import/export)
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
+# Feed de cambios (SSE): el front parchea su estado en vez de re-pedir todo
+@app.get("/events")
+async def events(request: Request):
+    return StreamingResponse(
+        broadcaster.stream(request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _publish_flete_creado(f: Flete, origen: str | None = None):
+    broadcaster.publish("flete_creado", {
+        "origen": origen,
+        "o_carga": f.o_carga,
+        "estado": f.estado,
+        "anio_mes": f.anio_mes,
+        "flete": FleteOut.model_validate(f).model_dump(),
+        "delta": delta(f.flete_cobrado, f.flete_pagado),
+    })
+
+def _fecha_filters(F, desde: date | None, hasta: date | None):
+    # Filtros sobre "fecha": permiten partition pruning
+    conds = []
+    if desde:
+        conds.append(F.fecha >= desde)
+    if hasta:
+        conds.append(F.fecha <= hasta)
+    return conds
+
+
 @app.get("/analytics")
-def analytics(db: Session = Depends(get_db)):
+def analytics(
+    request: Request,
+    response: Response,
+    desde: date | None = None,
+    hasta: date | None = None,
+    include_archived: bool = False,
+    db: Session = Depends(get_db),
+):
+    not_modified = check_not_modified(request, response, db)
+    if not_modified:
+        return not_modified
+
+    F = fletes_source(include_archived)
+    conds = _fecha_filters(F, desde, hasta)
+
     # Agrupado por mes
     by_mes = db.execute(
         select(
-            Flete.anio_mes,
-            func.coalesce(func.sum(Flete.flete_cobrado), 0).label("cobrado"),
-            func.coalesce(func.sum(Flete.flete_pagado), 0).label("pagado"),
-            func.coalesce(func.sum(Flete.diferencia), 0).label("diferencia"),
+            F.anio_mes,
+            func.coalesce(func.sum(F.flete_cobrado), 0).label("cobrado"),
+            func.coalesce(func.sum(F.flete_pagado), 0).label("pagado"),
+            func.coalesce(func.sum(F.diferencia), 0).label("diferencia"),
         )
-        .where(Flete.anio_mes.isnot(None))
-        .group_by(Flete.anio_mes)
-        .order_by(Flete.anio_mes.asc())
+        .where(F.anio_mes.isnot(None), *conds)
+        .group_by(F.anio_mes)
+        .order_by(F.anio_mes.asc())
     ).all()
 
     # Agrupado por estado
     by_estado = db.execute(
         select(
-            Flete.estado,
-            func.count(Flete.id).label("cantidad"),
-            func.coalesce(func.sum(Flete.flete_cobrado), 0).label("cobrado"),
-            func.coalesce(func.sum(Flete.flete_pagado), 0).label("pagado"),
-            func.coalesce(func.sum(Flete.diferencia), 0).label("diferencia"),
+            F.estado,
+            func.count(F.id).label("cantidad"),
+            func.coalesce(func.sum(F.flete_cobrado), 0).label("cobrado"),
+            func.coalesce(func.sum(F.flete_pagado), 0).label("pagado"),
+            func.coalesce(func.sum(F.diferencia), 0).label("diferencia"),
         )
-        .group_by(Flete.estado)
-        .order_by(Flete.estado.asc())
+        .where(*conds)
+        .group_by(F.estado)
+        .order_by(F.estado.asc())
     ).all()
 
     # Totales
     tot = db.execute(
         select(
-            func.count(Flete.id).label("cantidad"),
-            func.coalesce(func.sum(Flete.flete_cobrado), 0).label("cobrado"),
-            func.coalesce(func.sum(Flete.flete_pagado), 0).label("pagado"),
-            func.coalesce(func.sum(Flete.diferencia), 0).label("diferencia"),
+            func.count(F.id).label("cantidad"),
+            func.coalesce(func.sum(F.flete_cobrado), 0).label("cobrado"),
+            func.coalesce(func.sum(F.flete_pagado), 0).label("pagado"),
+            func.coalesce(func.sum(F.diferencia), 0).label("diferencia"),
         )
+        .where(*conds)
     ).one()
 
     def row_to_dict(r, keys):
@@ -110,7 +299,11 @@ def analytics(db: Session = Depends(get_db)):
 # Transportistas
 # -------------------------
 @app.post("/transportistas", response_model=TransportistaOut)
-def crear_transportista(payload: TransportistaCreate, db: Session = Depends(get_db)):
+def crear_transportista(
+    payload: TransportistaCreate,
+    x_client_id: str | None = Header(None),
+    db: Session = Depends(get_db),
+):
     nombre = payload.nombre.strip()
 
     exists = db.execute(
@@ -123,17 +316,147 @@ def crear_transportista(payload: TransportistaCreate, db: Session = Depends(get_
     db.add(t)
     db.commit()
     db.refresh(t)
+    broadcaster.publish("transportista_creado", {"origen": x_client_id, "id": t.id, "nombre": t.nombre})
     return t
 
 
 @app.get("/transportistas", response_model=list[TransportistaOut])
-def listar_transportistas(db: Session = Depends(get_db)):
+def listar_transportistas(request: Request, response: Response, db: Session = Depends(get_db)):
+    not_modified = check_not_modified(request, response, db)
+    if not_modified:
+        return not_modified
+
     rows = db.execute(
         select(Transportista).order_by(Transportista.nombre.asc())
     ).scalars().all()
     return rows
 
 
+# -------------------------
+# Liquidación a transportistas
+# -------------------------
+def _liquidacion_check(formato: str, desde: date | None, hasta: date | None) -> str:
+    formato = formato.strip().lower()
+    if formato not in {"json", "xlsx", "csv"}:
+        raise HTTPException(status_code=400, detail="formato inválido. Usá: json, xlsx o csv")
+    if desde and hasta and desde > hasta:
+        raise HTTPException(status_code=400, detail="desde tiene que ser <= hasta")
+    return formato
+
+
+def _liquidacion_archivo(
+    db: Session,
+    tots: list[dict],
+    formato: str,
+    desde: date | None,
+    hasta: date | None,
+    transportista_id: int | None,
+    include_archived: bool,
+    filename: str,
+    timer: StageTimer,
+):
+    if formato == "csv":
+        # Los viajes se leen de la DB mientras se manda la respuesta
+        body = iter_csv(tots, desde, hasta, transportista_id, include_archived)
+        media_type = "text/csv; charset=utf-8"
+    else:
+        with timer("build"):
+            body = build_xlsx(tots, liquidacion_viajes(db, desde, hasta, transportista_id, include_archived))
+        media_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+    timings = timer.finish()
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}.{formato}"',
+            "Server-Timing": ", ".join(f"{k};dur={v}" for k, v in timings.items()),
+        },
+    )
+
+
+def _liquidacion_filename(desde: date | None, hasta: date | None, nombre: str = "") -> str:
+    partes = ["LIQUIDACION"]
+    if nombre:
+        partes.append(re.sub(r"[^A-Za-z0-9]+", "_", nombre).strip("_").upper())
+    if desde:
+        partes.append(f"{desde:%Y%m%d}")
+    if hasta:
+        partes.append(f"{hasta:%Y%m%d}")
+    return "_".join(p for p in partes if p)
+
+
+# Liquidación de todos los transportistas: xlsx con una hoja por transportista.
+# Por defecto incluye el archivo (la liquidación tiene que tener todos los viajes del rango)
+@app.get("/liquidaciones")
+def liquidaciones(
+    desde: date | None = None,
+    hasta: date | None = None,
+    formato: str = "xlsx",
+    tolerancia: float = TOLERANCIA_PCT,
+    include_archived: bool = True,
+    db: Session = Depends(get_db),
+):
+    formato = _liquidacion_check(formato, desde, hasta)
+    timer = StageTimer("liquidacion")
+
+    with timer("query"):
+        tots = liquidacion_totales(db, desde, hasta, None, tolerancia, include_archived)
+
+    if formato == "json":
+        # Sólo totales (los viajes salen por /transportistas/{id}/liquidacion)
+        timer.finish()
+        return {"desde": desde, "hasta": hasta, "tolerancia": tolerancia, "transportistas": tots}
+
+    return _liquidacion_archivo(
+        db, tots, formato, desde, hasta, None, include_archived,
+        _liquidacion_filename(desde, hasta), timer,
+    )
+
+
+@app.get("/transportistas/{transportista_id}/liquidacion")
+def liquidacion_transportista(
+    transportista_id: int,
+    desde: date | None = None,
+    hasta: date | None = None,
+    formato: str = "json",
+    tolerancia: float = TOLERANCIA_PCT,
+    include_archived: bool = True,
+    db: Session = Depends(get_db),
+):
+    formato = _liquidacion_check(formato, desde, hasta)
+
+    t = db.get(Transportista, transportista_id)
+    if not t:
+        raise HTTPException(status_code=404, detail="Transportista no existe")
+
+    timer = StageTimer("liquidacion")
+    with timer("query"):
+        tots = liquidacion_totales(db, desde, hasta, transportista_id, tolerancia, include_archived)
+
+    if formato != "json":
+        return _liquidacion_archivo(
+            db, tots or [liquidacion_sin_viajes(t)], formato, desde, hasta, transportista_id, include_archived,
+            _liquidacion_filename(desde, hasta, t.nombre), timer,
+        )
+
+    with timer("query"):
+        rows = liquidacion_viajes(db, desde, hasta, transportista_id, include_archived)
+        viajes = [
+            {k: v for k, v in r._mapping.items() if k != "transportista_id"}
+            for r in rows
+        ]
+    timer.finish()
+    return {
+        "transportista": {"id": t.id, "nombre": t.nombre},
+        "desde": desde,
+        "hasta": hasta,
+        "tolerancia": tolerancia,
+        "totales": tots[0] if tots else liquidacion_sin_viajes(t),
+        "viajes": viajes,
+    }
+
+
 # -------------------------
 # Fletes
 # -------------------------
@@ -141,9 +464,13 @@ def listar_transportistas(db: Session = Depends(get_db)):
 def crear_flete(payload: FleteCreate, db: Session = Depends(get_db)):
     o_carga = payload.o_carga.strip()
 
+    # Antes de tocar "fletes" en esta transacción (ver create_partitions)
+    ensure_partition(payload.fecha)
+
     exists = db.execute(
-        select(Flete).where(Flete.o_carga == o_carga)
-    ).scalar_one_or_none()
+        select(Flete.id).where(Flete.o_carga == o_carga)
+        .union_all(select(FleteArchivado.id).where(FleteArchivado.o_carga == o_carga))
+    ).first()
     if exists:
         raise HTTPException(status_code=409, detail="O.Carga ya existe")
 
@@ -153,15 +480,11 @@ def crear_flete(payload: FleteCreate, db: Session = Depends(get_db)):
     if not t:
         raise HTTPException(status_code=404, detail="Transportista no existe")
 
-    cobrado = payload.flete_cobrado or 0
-    pagado = payload.flete_pagado or 0
-    diferencia = cobrado - pagado
-
+    # diferencia y anio_mes los calcula la DB
     f = Flete(
         fecha=payload.fecha,
         dia=payload.dia,
         o_carga=o_carga,
-        anio_mes=payload.anio_mes,
         cliente_destino=payload.cliente_destino,
         # estado NO se setea acá (se setea por import o más adelante por UI)
         transportista_id=payload.transportista_id,
@@ -175,12 +498,12 @@ def crear_flete(payload: FleteCreate, db: Session = Depends(get_db)):
         flete_cobrado=payload.flete_cobrado,
         tarifa_tte=payload.tarifa_tte,
         flete_pagado=payload.flete_pagado,
-        diferencia=diferencia,
         observacion=payload.observacion,
     )
     db.add(f)
     db.commit()
     db.refresh(f)
+    _publish_flete_creado(f)
     return f
 
 
@@ -188,38 +511,56 @@ from sqlalchemy import or_
 
 @app.get("/fletes", response_model=list[FleteOut])
 def listar_fletes(
+    request: Request,
+    response: Response,
     estado: str | None = None,
     anio_mes: str | None = None,
+    desde: date | None = None,
+    hasta: date | None = None,
     transportista_id: int | None = None,
     q: str | None = None,
     limit: int = 200,
     offset: int = 0,
+    include_archived: bool = False,
     db: Session = Depends(get_db),
 ):
+    not_modified = check_not_modified(request, response, db)
+    if not_modified:
+        return not_modified
+
     limit = max(1, min(limit, 2000))
     offset = max(0, offset)
 
-    stmt = select(Flete)
+    F = fletes_source(include_archived)
+    stmt = select(F)
 
     if estado:
-        stmt = stmt.where(Flete.estado == estado.strip().lower())
+        stmt = stmt.where(F.estado == estado.strip().lower())
 
     if anio_mes:
-        stmt = stmt.where(Flete.anio_mes == anio_mes.strip())
+        rango = month_range(anio_mes)
+        if rango:
+            # anio_mes sale de "fecha": filtrar por rango usa el índice / las particiones
+            stmt = stmt.where(F.fecha >= rango[0], F.fecha < rango[1])
+        else:
+            stmt = stmt.where(F.anio_mes == anio_mes.strip())
+
+    for cond in _fecha_filters(F, desde, hasta):
+        stmt = stmt.where(cond)
 
     if transportista_id:
-        stmt = stmt.where(Flete.transportista_id == transportista_id)
+        stmt = stmt.where(F.transportista_id == transportista_id)
 
     if q:
         qq = f"%{q.strip()}%"
         stmt = stmt.where(
             or_(
-                Flete.o_carga.ilike(qq),
-                Flete.cliente_destino.ilike(qq),
+                F.o_carga.ilike(qq),
+                F.cliente_destino.ilike(qq),
             )
         )
 
-    stmt = stmt.order_by(Flete.fecha.desc().nullslast(), Flete.id.desc()).limit(limit).offset(offset)
+    stmt = stmt.order_by(F.fecha.desc().nullslast(), F.id.desc()).limit(limit).offset(offset)
 
     rows = db.execute(stmt).scalars().all()
     return rows
@@ -232,7 +573,6 @@ class FleteWebCreate(BaseModel):
     fecha: date | None = None
     dia: str | None = None
     o_carga: str
-    anio_mes: str | None = None
     cliente_destino: str | None = None
 
     transportista_id: int
@@ -254,12 +594,22 @@ class FleteWebCreate(BaseModel):
 
 
 @app.post("/fletes-web", response_model=FleteOut)
-def crear_flete_web(payload: FleteWebCreate, db: Session = Depends(get_db)):
+def crear_flete_web(
+    payload: FleteWebCreate,
+    x_client_id: str | None = Header(None),
+    db: Session = Depends(get_db),
+):
     oc = payload.o_carga.strip()
     if not oc:
         raise HTTPException(status_code=400, detail="O.Carga es obligatorio")
 
-    exists = db.execute(select(Flete).where(Flete.o_carga == oc)).scalar_one_or_none()
+    # Antes de tocar "fletes" en esta transacción (ver create_partitions)
+    ensure_partition(payload.fecha)
+
+    exists = db.execute(
+        select(Flete.id).where(Flete.o_carga == oc)
+        .union_all(select(FleteArchivado.id).where(FleteArchivado.o_carga == oc))
+    ).first()
     if exists:
         raise HTTPException(status_code=409, detail="O.Carga ya existe")
 
@@ -272,16 +622,12 @@ def crear_flete_web(payload: FleteWebCreate, db: Session = Depends(get_db)):
     if not t:
         raise HTTPException(status_code=404, detail="Transportista no existe")
 
-    cobrado = payload.flete_cobrado or Decimal("0")
-    pagado = payload.flete_pagado or Decimal("0")
-    diferencia = cobrado - pagado
-
+    # diferencia y anio_mes los calcula la DB
     f = Flete(
         estado=est,
         fecha=payload.fecha,
         dia=payload.dia,
         o_carga=oc,
-        anio_mes=payload.anio_mes,
         cliente_destino=payload.cliente_destino,
         transportista_id=payload.transportista_id,
         cod_transporte=payload.cod_transporte,
@@ -294,140 +640,28 @@ def crear_flete_web(payload: FleteWebCreate, db: Session = Depends(get_db)):
         flete_cobrado=payload.flete_cobrado,
         tarifa_tte=payload.tarifa_tte,
         flete_pagado=payload.flete_pagado,
-        diferencia=diferencia,
         observacion=payload.observacion,
     )
     db.add(f)
     db.commit()
     db.refresh(f)
+    _publish_flete_creado(f, x_client_id)
     return f
 
-# -------------------------
-# Helpers import Excel
-# -------------------------
-def _norm(s: str) -> str:
-    """
-    Normaliza textos para matching:
-    - quita tildes
-    - MAYUS
-    - reemplaza símbolos por espacios
-    - colapsa espacios
-    """
-    if s is None:
-        return ""
-    s = str(s).strip()
-    s = unicodedata.normalize("NFKD", s)
-    s = "".join(ch for ch in s if not unicodedata.combining(ch))
-    s = s.upper()
-    s = re.sub(r"[./()\-\n\r\t]+", " ", s)
-    s = re.sub(r"\s+", " ", s).strip()
-    return s
-
-
-EXPECTED_COLS = {
-    "FECHA": "fecha",
-    "DIA": "dia",
-    "O CARGA": "o_carga",
-    "ANO MES": "anio_mes",
-    "AÑO MES": "anio_mes",
-
-    "CLIENTE DESTINO": "cliente_destino",
-    "CLIENTE / DESTINO": "cliente_destino",
-    "TRANSPORTISTA": "transportista",
-    "COD TRANSPORTE": "cod_transporte",
-    "INGRESE TRANSPORTE": "ingrese_transporte",
-
-    "KM": "km",
-    "TN ORDEN DE CARGA": "tn_orden_carga",
-    "TN ORDEN CARGA": "tn_orden_carga",
-    "TN CARGADAS": "tn_cargadas",
-    "AFORO": "aforo",
-
-    "TARIFA ASIGN": "tarifa_asign",
-    "FLETE COBRADO": "flete_cobrado",
-    "TARIFA TTE": "tarifa_tte",
-    "TARIFA TTE.": "tarifa_tte",
-    "FLETE PAGADO": "flete_pagado",
-
-    "DIFERENCIA": "diferencia",
-    "OBSERVACION": "observacion",
-    "OBSERVACION ": "observacion",
-    "OBSERVACIÓN": "observacion",
-}
-
-
-def _to_date(v):
-    if v is None or v == "":
-        return None
-    if isinstance(v, date) and not isinstance(v, datetime):
-        return v
-    if isinstance(v, datetime):
-        return v.date()
-
-    s = str(v).strip()
-    for fmt in ("%d/%m/%Y", "%Y-%m-%d", "%d-%m-%Y"):
-        try:
-            return datetime.strptime(s, fmt).date()
-        except ValueError:
-            pass
-    return None
-
-
-def _to_decimal(v):
-    if v is None or v == "":
-        return None
-    if isinstance(v, (int, float, Decimal)):
-        try:
-            return Decimal(str(v))
-        except InvalidOperation:
-            return None
-
-    s = str(v).strip().replace(" ", "")
-    # soporta 1.234,56 / 1234,56 / 1234.56
-    if s.count(",") == 1 and s.count(".") >= 1:
-        s = s.replace(".", "").replace(",", ".")
-    elif s.count(",") == 1 and s.count(".") == 0:
-        s = s.replace(",", ".")
-    try:
-        return Decimal(s)
-    except InvalidOperation:
-        return None
-
-
-def _find_header_row_and_map(ws):
-    """
-    Busca una fila con headers que contengan al menos O.CARGA y TRANSPORTISTA.
-    Devuelve: (header_row_idx, col_map) donde col_map = {field: col_index_1based}
-    """
-    for r in range(1, min(ws.max_row, 120) + 1):
-        col_map = {}
-        for c in range(1, ws.max_column + 1):
-            raw = ws.cell(row=r, column=c).value
-            if raw is None:
-                continue
-            key = _norm(raw)
-
-            if key in EXPECTED_COLS:
-                col_map[EXPECTED_COLS[key]] = c
-                continue
-
-            # fallback por contains
-            if "CLIENTE" in key and "DESTINO" in key:
-                col_map["cliente_destino"] = c
-
-        if "o_carga" in col_map and "transportista" in col_map:
-            return r, col_map
-
-    return None, None
-
-
 # -------------------------
 # Import Excel (3 hojas) - SKIP por O.Carga
 # -------------------------
 @app.post("/import-excel")
-async def import_excel(file: UploadFile = File(...), db: Session = Depends(get_db)):
+async def import_excel(
+    file: UploadFile = File(...),
+    x_client_id: str | None = Header(None),
+    db: Session = Depends(get_db),
+):
+    timer = StageTimer("import_excel")
+
     content = await file.read()
-    wb = openpyxl.load_workbook(BytesIO(content), data_only=True, read_only=True)
+    with timer("parse"):
+        wb = openpyxl.load_workbook(BytesIO(content), data_only=True, read_only=True)
 
     # Procesamos estas 3 hojas (si existen)
     sheets_to_process = {"transporte", "viajes en camino", "viajes concretados", "base datos"}
@@ -437,8 +671,13 @@ async def import_excel(file: UploadFile = File(...), db: Session = Depends(get_d
     transportistas_created = 0
     processed_sheets = []
 
+    # Deltas de agregados para el evento "import_finalizado"
+    deltas_mes = {}
+    deltas_estado = {}
+
     # Cache: O.Carga existentes
     existing = set(db.execute(select(Flete.o_carga)).scalars().all())
+    existing.update(db.execute(select(FleteArchivado.o_carga)).scalars().all())
 
     # Cache transportistas por nombre
     transportista_cache = {}
@@ -463,15 +702,6 @@ async def import_excel(file: UploadFile = File(...), db: Session = Depends(get_d
         transportista_cache[nombre] = t.id
         return t.id
 
-    def get_text(ws, r: int, col_map, field: str):
-        if field not in col_map:
-            return None
-        v = ws.cell(row=r, column=col_map[field]).value
-        if v is None:
-            return None
-        s = str(v).strip()
-        return s if s != "" else None
-
     # Recorremos todas las hojas y tomamos solo las 3 que queremos
     for sname in wb.sheetnames:
         sname_clean = sname.strip().lower()
@@ -479,7 +709,8 @@ async def import_excel(file: UploadFile = File(...), db: Session = Depends(get_d
             continue
 
         ws = wb[sname]
-        header_row, col_map = _find_header_row_and_map(ws)
+        with timer("parse"):
+            header_row, col_map = _find_header_row_and_map(ws)
         if not header_row:
             continue
 
@@ -487,91 +718,116 @@ async def import_excel(file: UploadFile = File(...), db: Session = Depends(get_d
 
         estado = "viajes concretados" if sname_clean == "base datos" else sname_clean
 
-        r = header_row + 1
-        blank_streak = 0
-        MAX_BLANK_STREAK = 200  # corta cuando hay muchas filas vacías seguidas
+        # Una sola pasada por la hoja (iter_rows) y conversión por columna con
+        # cache: ws.cell() en modo read_only vuelve a leer la hoja en cada llamada.
+        parsers = {field: ColumnParser(kind) for field, kind in COLUMN_KINDS.items()}
 
+        chunks = read_data_rows(ws, header_row, col_map)
         while True:
-            oc_cell = ws.cell(row=r, column=col_map["o_carga"]).value
-            o_carga = (str(oc_cell).strip() if oc_cell is not None else "")
-
-            if not o_carga:
-                blank_streak += 1
-                if blank_streak >= MAX_BLANK_STREAK:
+            with timer("parse"):
+                # La hoja se lee al avanzar el generador: también cuenta como "parse"
+                rows = next(chunks, None)
+                if rows is None:
                     break
-                r += 1
-                continue
-
-            blank_streak = 0
-
-            # SKIP si ya existe
-            if o_carga in existing:
-                skipped += 1
-                r += 1
-                continue
-
-            # Transportista
-            tr_name = ws.cell(row=r, column=col_map["transportista"]).value
-            transportista_id = get_or_create_transportista_id(str(tr_name) if tr_name is not None else "")
-
-            fecha = _to_date(ws.cell(row=r, column=col_map["fecha"]).value) if "fecha" in col_map else None
-
-            km = _to_decimal(ws.cell(row=r, column=col_map["km"]).value) if "km" in col_map else None
-            tn_orden = _to_decimal(ws.cell(row=r, column=col_map["tn_orden_carga"]).value) if "tn_orden_carga" in col_map else None
-            tn_carg = _to_decimal(ws.cell(row=r, column=col_map["tn_cargadas"]).value) if "tn_cargadas" in col_map else None
-            aforo = _to_decimal(ws.cell(row=r, column=col_map["aforo"]).value) if "aforo" in col_map else None
-
-            tarifa_asign = _to_decimal(ws.cell(row=r, column=col_map["tarifa_asign"]).value) if "tarifa_asign" in col_map else None
-            flete_cobrado = _to_decimal(ws.cell(row=r, column=col_map["flete_cobrado"]).value) if "flete_cobrado" in col_map else None
-            tarifa_tte = _to_decimal(ws.cell(row=r, column=col_map["tarifa_tte"]).value) if "tarifa_tte" in col_map else None
-            flete_pagado = _to_decimal(ws.cell(row=r, column=col_map["flete_pagado"]).value) if "flete_pagado" in col_map else None
-
-            cobrado = flete_cobrado or Decimal("0")
-            pagado = flete_pagado or Decimal("0")
-            diferencia = cobrado - pagado
-
-            f = Flete(
-                fecha=fecha,
-                dia=get_text(ws, r, col_map, "dia"),
-                o_carga=o_carga,
-                anio_mes=get_text(ws, r, col_map, "anio_mes"),
-                cliente_destino=get_text(ws, r, col_map, "cliente_destino"),
-                estado=estado,
-                transportista_id=transportista_id,
-                cod_transporte=get_text(ws, r, col_map, "cod_transporte"),
-                ingrese_transporte=get_text(ws, r, col_map, "ingrese_transporte"),
-                km=km,
-                tn_orden_carga=tn_orden,
-                tn_cargadas=tn_carg,
-                aforo=aforo,
-                tarifa_asign=tarifa_asign,
-                flete_cobrado=flete_cobrado,
-                tarifa_tte=tarifa_tte,
-                flete_pagado=flete_pagado,
-                diferencia=diferencia,
-                observacion=get_text(ws, r, col_map, "observacion"),
-            )
 
-            db.add(f)
-            inserted += 1
-            existing.add(o_carga)
-
-            if inserted % 200 == 0:
-                db.commit()
-
-            r += 1
-
-    db.commit()
+                # SKIP si ya existe (también si se repite dentro del mismo Excel)
+                nuevas = []
+                for row, o_carga in zip(rows, [_oc_text(v) for v in column(rows, col_map, "o_carga")]):
+                    if o_carga in existing:
+                        skipped += 1
+                        continue
+                    existing.add(o_carga)
+                    nuevas.append((row, o_carga))
+                if not nuevas:
+                    continue
+
+                rows = [row for row, _ in nuevas]
+                cols = {field: parser.parse(column(rows, col_map, field)) for field, parser in parsers.items()}
+
+            nuevos_meses = missing_partitions(cols["fecha"])
+            if nuevos_meses:
+                # Commit antes: esta transacción tiene locks sobre "fletes" y el DDL va por otra conexión
+                with timer("commit"):
+                    db.commit()
+                with timer("insert"):
+                    # En un thread: el DDL espera locks sobre "fletes" y no puede frenar el loop (ej. /events)
+                    await run_in_threadpool(create_partitions, nuevos_meses)
+
+            for i, (_, o_carga) in enumerate(nuevas):
+                # Transportista
+                with timer("resolve_transportistas"):
+                    transportista_id = get_or_create_transportista_id(cols["transportista"][i])
+
+                fecha = cols["fecha"][i]
+                flete_cobrado = cols["flete_cobrado"][i]
+                flete_pagado = cols["flete_pagado"][i]
+
+                with timer("insert"):
+                    # diferencia y anio_mes los calcula la DB (se ignoran las columnas del Excel)
+                    f = Flete(
+                        fecha=fecha,
+                        dia=cols["dia"][i],
+                        o_carga=o_carga,
+                        cliente_destino=cols["cliente_destino"][i],
+                        estado=estado,
+                        transportista_id=transportista_id,
+                        cod_transporte=cols["cod_transporte"][i],
+                        ingrese_transporte=cols["ingrese_transporte"][i],
+                        km=cols["km"][i],
+                        tn_orden_carga=cols["tn_orden_carga"][i],
+                        tn_cargadas=cols["tn_cargadas"][i],
+                        aforo=cols["aforo"][i],
+                        tarifa_asign=cols["tarifa_asign"][i],
+                        flete_cobrado=flete_cobrado,
+                        tarifa_tte=cols["tarifa_tte"][i],
+                        flete_pagado=flete_pagado,
+                        observacion=cols["observacion"][i],
+                    )
+                    db.add(f)
+
+                inserted += 1
+
+                d = delta(flete_cobrado, flete_pagado)
+                add_delta(deltas_estado, estado, d)
+                if fecha:
+                    add_delta(deltas_mes, f"{fecha:%Y%m}", d)
+
+                if inserted % 200 == 0:
+                    with timer("insert"):
+                        db.flush()
+                    with timer("commit"):
+                        db.commit()
+
+    with timer("insert"):
+        db.flush()
+    with timer("commit"):
+        db.commit()
 
     if not processed_sheets:
         raise HTTPException(status_code=400, detail="No encontré ninguna de las 3 hojas objetivo para importar.")
 
+    totales = {}
+    for d in deltas_estado.values():
+        add_delta(totales, "totales", d)
+    broadcaster.publish("import_finalizado", {
+        "origen": x_client_id,
+        "inserted": inserted,
+        "skipped": skipped,
+        "transportistas_created": transportistas_created,
+        "delta": {
+            "totales": totales.get("totales"),
+            "por_mes": deltas_mes,
+            "por_estado": deltas_estado,
+        },
+    })
+
     return {
         "ok": True,
         "processed_sheets": processed_sheets,
         "inserted": inserted,
         "skipped": skipped,
         "transportistas_created": transportistas_created,
+        "timings_ms": timer.finish(),
     }
 
 
@@ -579,7 +835,12 @@ async def import_excel(file: UploadFile = File(...), db: Session = Depends(get_d
 # Export Excel (3 hojas)
 # -------------------------
 @app.get("/export-excel")
-def export_excel(db: Session = Depends(get_db)):
+def export_excel(
+    desde: date | None = None,
+    hasta: date | None = None,
+    include_archived: bool = False,
+    db: Session = Depends(get_db),
+):
     headers = [
         "FECHA",
         "Día",
@@ -601,13 +862,16 @@ def export_excel(db: Session = Depends(get_db)):
         "OBSERVACION",
     ]
 
+    timer = StageTimer("export_excel")
+
     wb = openpyxl.Workbook()
     # Sacamos la hoja default
     wb.remove(wb.active)
 
     # Cache transportistas
-    transportistas = db.execute(select(Transportista)).scalars().all()
-    tmap = {t.id: t.nombre for t in transportistas}
+    with timer("query"):
+        transportistas = db.execute(select(Transportista)).scalars().all()
+        tmap = {t.id: t.nombre for t in transportistas}
 
     def dec_to_number(x):
         if x is None:
@@ -617,23 +881,26 @@ def export_excel(db: Session = Depends(get_db)):
         except Exception:
             return x
 
+    F = fletes_source(include_archived)
+
     def add_sheet(title: str, estado_value: str):
         ws = wb.create_sheet(title=title)
         ws.append(headers)
 
-        fletes = db.execute(
-            select(Flete)
-            .where(Flete.estado == estado_value)
-            .order_by(Flete.fecha.asc().nullslast(), Flete.o_carga.asc())
-        ).scalars().all()
+        with timer("query"):
+            fletes = db.execute(
+                select(F)
+                .where(F.estado == estado_value, *_fecha_filters(F, desde, hasta))
+                .order_by(F.fecha.asc().nullslast(), F.o_carga.asc())
+            ).scalars().all()
+
+        with timer("build"):
+            append_fletes(ws, fletes)
 
+    def append_fletes(ws, fletes):
         for f in fletes:
             transportista_nombre = tmap.get(f.transportista_id, "")
 
-            cobrado = f.flete_cobrado or Decimal("0")
-            pagado = f.flete_pagado or Decimal("0")
-            diferencia = cobrado - pagado
-
             ws.append([
                 f.fecha,
                 f.dia,
@@ -651,7 +918,7 @@ def export_excel(db: Session = Depends(get_db)):
                 dec_to_number(f.flete_cobrado),
                 dec_to_number(f.tarifa_tte),
                 dec_to_number(f.flete_pagado),
-                dec_to_number(diferencia),
+                dec_to_number(f.diferencia),
                 f.observacion,
             ])
 
@@ -660,14 +927,19 @@ def export_excel(db: Session = Depends(get_db)):
     add_sheet("viajes concretados", "viajes concretados")
 
     output = BytesIO()
-    wb.save(output)
+    with timer("save"):
+        wb.save(output)
     output.seek(0)
 
+    timings = timer.finish()
     filename = "FLETES_COBRADOS_PAGADOS_EXPORT.xlsx"
     return StreamingResponse(
         output,
         media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "Server-Timing": ", ".join(f"{k};dur={v}" for k, v in timings.items()),
+        },
     )
 from pydantic import BaseModel, Field
 
@@ -675,11 +947,21 @@ class EstadoUpdate(BaseModel):
     estado: str = Field(min_length=1, max_length=60)
 
 @app.patch("/fletes/{o_carga}/estado")
-def cambiar_estado(o_carga: str, payload: EstadoUpdate, db: Session = Depends(get_db)):
+def cambiar_estado(
+    o_carga: str,
+    payload: EstadoUpdate,
+    x_client_id: str | None = Header(None),
+    db: Session = Depends(get_db),
+):
     oc = o_carga.strip()
 
     f = db.execute(select(Flete).where(Flete.o_carga == oc)).scalar_one_or_none()
     if not f:
+        archivado = db.execute(
+            select(FleteArchivado.id).where(FleteArchivado.o_carga == oc)
+        ).scalar_one_or_none()
+        if archivado:
+            raise HTTPException(status_code=409, detail="O.Carga archivado (viaje concretado)")
         raise HTTPException(status_code=404, detail="No existe ese O.Carga")
 
     nuevo = payload.estado.strip().lower()
@@ -687,7 +969,38 @@ def cambiar_estado(o_carga: str, payload: EstadoUpdate, db: Session = Depends(ge
     if nuevo not in validos:
         raise HTTPException(status_code=400, detail=f"Estado inválido. Usá: {sorted(validos)}")
 
+    anterior = f.estado
     f.estado = nuevo
     db.commit()
 
+    if anterior != nuevo:
+        broadcaster.publish("estado_cambiado", {
+            "origen": x_client_id,
+            "o_carga": oc,
+            "anterior": anterior,
+            "estado": nuevo,
+            "anio_mes": f.anio_mes,
+            "delta": {
+                "por_estado": {
+                    anterior: delta(f.flete_cobrado, f.flete_pagado, -1),
+                    nuevo: delta(f.flete_cobrado, f.flete_pagado),
+                },
+            },
+        })
+
     return {"ok": True, "o_carga": oc, "estado": nuevo}
+
+
+# -------------------------
+# Archivo (viajes concretados viejos)
+# -------------------------
+@app.post("/archivar")
+def archivar(meses: int = 3, db: Session = Depends(get_db)):
+    if meses < 1:
+        raise HTTPException(status_code=400, detail="meses tiene que ser >= 1")
+
+    antes_de = months_ago(meses)
+    archivados = archive_concluded(db, antes_de)
+    if archivados:
+        broadcaster.publish("fletes_archivados", {"antes_de": antes_de, "archivados": archivados})
+    return {"ok": True, "antes_de": antes_de, "archivados": archivados}
@@ -0,0 +1,232 @@
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from sqlalchemy import event
+from starlette.routing import Match
+
+logger = logging.getLogger(__name__)
+
+# Queries más lentas que esto se loguean con su EXPLAIN
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+EXCLUDED_PATHS = {"/events", "/metrics"}
+
+
+@dataclass
+class RequestStats:
+    statements: int = 0
+    db_seconds: float = 0.0
+    # None = el driver no informa filas devueltas (ver instrument_engine)
+    rows: int | None = None
+
+
+_current: ContextVar[RequestStats | None] = ContextVar("request_stats", default=None)
+
+
+class Registry:
+    """Métricas en memoria, exportadas en formato Prometheus por /metrics."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}  # (name, labels) -> [bucket counts..., sum, count]
+        self._counters = {}  # (name, labels) -> value
+        self._help = {}
+
+    def describe(self, name: str, kind: str, help_text: str):
+        self._help[name] = (kind, help_text)
+
+    def inc(self, name: str, labels: tuple, value: float = 1.0):
+        with self._lock:
+            self._counters[(name, labels)] = self._counters.get((name, labels), 0.0) + value
+
+    def observe(self, name: str, labels: tuple, value: float):
+        with self._lock:
+            h = self._histograms.setdefault((name, labels), [0] * len(LATENCY_BUCKETS) + [0.0, 0])
+            for i, le in enumerate(LATENCY_BUCKETS):
+                if value <= le:
+                    h[i] += 1
+            h[-2] += value
+            h[-1] += 1
+
+    def render(self) -> str:
+        def fmt_labels(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            inner = ",".join(f'{k}="{str(v).replace(chr(34), chr(39))}"' for k, v in pairs)
+            return "{" + inner + "}"
+
+        lines = []
+        with self._lock:
+            for name, (kind, help_text) in sorted(self._help.items()):
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                if kind == "histogram":
+                    for (n, labels), h in sorted(self._histograms.items()):
+                        if n != name:
+                            continue
+                        for le, c in zip(LATENCY_BUCKETS, h):
+                            lines.append(f"{name}_bucket{fmt_labels(labels, [('le', le)])} {c}")
+                        lines.append(f"{name}_bucket{fmt_labels(labels, [('le', '+Inf')])} {h[-1]}")
+                        lines.append(f"{name}_sum{fmt_labels(labels)} {h[-2]}")
+                        lines.append(f"{name}_count{fmt_labels(labels)} {h[-1]}")
+                else:
+                    for (n, labels), v in sorted(self._counters.items()):
+                        if n == name:
+                            lines.append(f"{name}{fmt_labels(labels)} {v}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+registry.describe("http_request_duration_seconds", "histogram", "Latencia por endpoint")
+registry.describe("http_request_sql_statements_total", "counter", "Sentencias SQL ejecutadas por endpoint")
+registry.describe("http_request_db_seconds_total", "counter", "Tiempo total en la DB por endpoint")
+registry.describe("http_request_db_rows_total", "counter", "Filas devueltas por la DB por endpoint (sólo Postgres)")
+registry.describe("job_stage_seconds", "histogram", "Duración de cada etapa de import / export")
+registry.describe("sql_slow_queries_total", "counter", "Queries por encima de SLOW_QUERY_MS")
+
+
+class MetricsMiddleware:
+    """Mide latencia, cantidad de SQL, tiempo de DB y filas por endpoint."""
+
+    def __init__(self, app):
+        self.app = app
+
+    def _route_path(self, scope) -> str:
+        router = getattr(scope.get("app"), "router", None)
+        for route in getattr(router, "routes", ()):
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return route.path
+        return "unmatched"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in EXCLUDED_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - t0
+            _current.reset(token)
+            route = (("method", scope["method"]), ("route", self._route_path(scope)))
+            registry.observe("http_request_duration_seconds", route + (("status", status["code"]),), elapsed)
+            registry.inc("http_request_sql_statements_total", route, stats.statements)
+            registry.inc("http_request_db_seconds_total", route, stats.db_seconds)
+            if stats.rows is not None:
+                registry.inc("http_request_db_rows_total", route, stats.rows)
+
+
+def _explain(cursor, statement, parameters, dialect_name: str) -> str:
+    # Cursor crudo del DBAPI: no vuelve a disparar los eventos de SQLAlchemy
+    prefix = "EXPLAIN QUERY PLAN " if dialect_name == "sqlite" else "EXPLAIN "
+    # En Postgres corre en la transacción del request: con un SAVEPOINT, si el
+    # EXPLAIN falla (ej. statement_timeout) la transacción no queda abortada
+    savepoint = dialect_name == "postgresql"
+    raw = cursor.connection.cursor()
+    try:
+        if savepoint:
+            raw.execute("SAVEPOINT metrics_explain")
+        try:
+            raw.execute(prefix + statement, parameters)
+            return "\n".join(" ".join(str(c) for c in row) for row in raw.fetchall())
+        except Exception:
+            if savepoint:
+                raw.execute("ROLLBACK TO SAVEPOINT metrics_explain")
+            raise
+        finally:
+            if savepoint:
+                raw.execute("RELEASE SAVEPOINT metrics_explain")
+    finally:
+        raw.close()
+
+
+def instrument_engine(engine):
+    """
+    Hooks de SQLAlchemy: cuenta sentencias / tiempo / filas y loguea las lentas.
+    Las filas salen de cursor.rowcount, que psycopg2 informa en los SELECT
+    (trae el resultado entero); sqlite3 devuelve -1, así que con SQLite
+    http_request_db_rows_total no se publica.
+    """
+    count_rows = engine.dialect.name == "postgresql"
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+
+        stats = _current.get()
+        if stats is not None:
+            stats.statements += 1
+            stats.db_seconds += elapsed
+            if count_rows and cursor.description is not None:
+                stats.rows = (stats.rows or 0) + max(cursor.rowcount, 0)
+
+        if elapsed * 1000 < SLOW_QUERY_MS:
+            return
+        registry.inc("sql_slow_queries_total", ())
+        plan = ""
+        if not executemany and statement.lstrip().upper().startswith(("SELECT", "WITH")):
+            try:
+                plan = _explain(cursor, statement, parameters, engine.dialect.name)
+            except Exception as exc:  # el EXPLAIN es best-effort
+                plan = f"(EXPLAIN falló: {exc})"
+        params = f"executemany x{len(parameters)}" if executemany else repr(parameters)[:500]
+        logger.warning("Query lenta (%.0f ms): %s\nparams=%s\n%s", elapsed * 1000, statement, params, plan)
+
+
+class StageTimer:
+    """
+    Acumula tiempos por etapa de un job (import / export):
+
+        timer = StageTimer("import_excel")
+        with timer("parse"):
+            ...
+        timer.finish()  # -> {"parse": ms, ...} y los publica en /metrics
+    """
+
+    def __init__(self, job: str):
+        self.job = job
+        self.totals: dict[str, float] = {}
+
+    def __call__(self, stage: str):
+        return _Stage(self, stage)
+
+    def finish(self) -> dict[str, float]:
+        for stage, seconds in self.totals.items():
+            registry.observe("job_stage_seconds", (("job", self.job), ("stage", stage)), seconds)
+        return {stage: round(seconds * 1000, 1) for stage, seconds in self.totals.items()}
+
+
+class _Stage:
+    __slots__ = ("timer", "stage", "t0")
+
+    def __init__(self, timer: StageTimer, stage: str):
+        self.timer = timer
+        self.stage = stage
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+
+    def __exit__(self, *exc):
+        totals = self.timer.totals
+        totals[self.stage] = totals.get(self.stage, 0.0) + time.perf_counter() - self.t0
@@ -1,11 +1,17 @@
 from sqlalchemy import (
     Column,
     Integer,
+    BigInteger,
     String,
     Date,
     DateTime,
     Numeric,
     ForeignKey,
+    Computed,
+    Index,
+    CheckConstraint,
+    cast,
+    extract,
     func,
 )
 from sqlalchemy.orm import relationship
@@ -37,7 +43,15 @@ class Flete(Base):
     dia = Column(String(30), nullable=True)
 
     o_carga = Column(String(80), unique=True, nullable=False, index=True)
-    anio_mes = Column(String(20), nullable=True)
+    # Derivado de "fecha" en la DB (ej: 202506)
+    anio_mes = Column(
+        String(20),
+        Computed(
+            cast(cast(extract("year", fecha) * 100 + extract("month", fecha), Integer), String(20)),
+            persisted=True,
+        ),
+        nullable=True,
+    )
 
     cliente_destino = Column(String(255), nullable=True)
 
@@ -59,7 +73,12 @@ class Flete(Base):
     tarifa_tte = Column(Numeric(12, 2), nullable=True)
     flete_pagado = Column(Numeric(12, 2), nullable=True)
 
-    diferencia = Column(Numeric(12, 2), nullable=True)
+    # Derivado de cobrado/pagado en la DB
+    diferencia = Column(
+        Numeric(12, 2),
+        Computed(func.coalesce(flete_cobrado, 0) - func.coalesce(flete_pagado, 0), persisted=True),
+        nullable=True,
+    )
 
     observacion = Column(String(500), nullable=True)
     estado = Column(String(60), nullable=True, index=True)
@@ -71,3 +90,78 @@ class Flete(Base):
         onupdate=func.now(),
         nullable=False,
     )
+
+    __table_args__ = (
+        # analytics por mes: index-only scan sobre los montos
+        Index(
+            "ix_fletes_anio_mes",
+            "anio_mes",
+            postgresql_include=["flete_cobrado", "flete_pagado", "diferencia"],
+        ),
+        # filtros por rango de fecha
+        Index("ix_fletes_fecha", "fecha"),
+        # orden por defecto de /fletes (más recientes primero, sin fecha al final).
+        # ix_fletes_fecha leído al revés da NULLS FIRST; SQLite no acepta NULLS LAST en índices
+        Index("ix_fletes_fecha_id_desc", fecha.desc().nullslast(), id.desc()).ddl_if(dialect="postgresql"),
+        # export por estado, ya ordenado
+        Index("ix_fletes_estado_fecha", "estado", "fecha", "o_carga"),
+        # liquidación por transportista y rango de fecha
+        Index("ix_fletes_transportista_fecha", "transportista_id", "fecha"),
+    )
+
+
+class FleteArchivado(Base):
+    """
+    Tabla fría: "viajes concretados" viejos movidos desde "fletes".
+    Mismas columnas que Flete, pero diferencia / anio_mes quedan guardadas
+    como valores comunes y sólo tiene los índices mínimos.
+    """
+    __tablename__ = "fletes_archivo"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+
+    fecha = Column(Date, nullable=True, index=True)
+    dia = Column(String(30), nullable=True)
+
+    o_carga = Column(String(80), unique=True, nullable=False)
+    anio_mes = Column(String(20), nullable=True)
+
+    cliente_destino = Column(String(255), nullable=True)
+
+    transportista_id = Column(Integer, ForeignKey("transportistas.id"), nullable=False)
+    transportista = relationship("Transportista")
+
+    cod_transporte = Column(String(80), nullable=True)
+    ingrese_transporte = Column(String(255), nullable=True)
+
+    km = Column(Numeric(12, 2), nullable=True)
+    tn_orden_carga = Column(Numeric(12, 3), nullable=True)
+    tn_cargadas = Column(Numeric(12, 3), nullable=True)
+
+    aforo = Column(Numeric(12, 3), nullable=True)
+
+    tarifa_asign = Column(Numeric(12, 2), nullable=True)
+    flete_cobrado = Column(Numeric(12, 2), nullable=True)
+
+    tarifa_tte = Column(Numeric(12, 2), nullable=True)
+    flete_pagado = Column(Numeric(12, 2), nullable=True)
+
+    diferencia = Column(Numeric(12, 2), nullable=True)
+
+    observacion = Column(String(500), nullable=True)
+    estado = Column(String(60), nullable=True)
+
+    created_at = Column(DateTime(timezone=True), nullable=False)
+    updated_at = Column(DateTime(timezone=True), nullable=False)
+    archivado_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
+class DataVersion(Base):
+    """Una sola fila (id=1); en Postgres la suben triggers (ver conditional.py)."""
+    __tablename__ = "data_version"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    version = Column(BigInteger, nullable=False, default=1)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    __table_args__ = (CheckConstraint("id = 1", name="ck_data_version_single_row"),)
@@ -0,0 +1,279 @@
+"""
+Parseo de planillas para /import-excel.
+
+Los helpers por celda (_to_date, _to_decimal, _norm) definen el resultado;
+ColumnParser convierte columnas enteras con el mismo resultado, pero
+memoizando los textos repetidos y probando primero el formato de fecha que
+ya funcionó en esa columna.
+"""
+import re
+import unicodedata
+from datetime import datetime, date
+from decimal import Decimal, InvalidOperation
+from functools import lru_cache
+
+
+def _norm(s: str) -> str:
+    """
+    Normaliza textos para matching:
+    - quita tildes
+    - MAYUS
+    - reemplaza símbolos por espacios
+    - colapsa espacios
+    """
+    if s is None:
+        return ""
+    return _norm_text(str(s))
+
+
+@lru_cache(maxsize=4096)
+def _norm_text(s: str) -> str:
+    s = s.strip()
+    s = unicodedata.normalize("NFKD", s)
+    s = "".join(ch for ch in s if not unicodedata.combining(ch))
+    s = s.upper()
+    s = re.sub(r"[./()\-\n\r\t]+", " ", s)
+    s = re.sub(r"\s+", " ", s).strip()
+    return s
+
+
+EXPECTED_COLS = {
+    "FECHA": "fecha",
+    "DIA": "dia",
+    "O CARGA": "o_carga",
+    "ANO MES": "anio_mes",
+    "AÑO MES": "anio_mes",
+
+    "CLIENTE DESTINO": "cliente_destino",
+    "CLIENTE / DESTINO": "cliente_destino",
+    "TRANSPORTISTA": "transportista",
+    "COD TRANSPORTE": "cod_transporte",
+    "INGRESE TRANSPORTE": "ingrese_transporte",
+
+    "KM": "km",
+    "TN ORDEN DE CARGA": "tn_orden_carga",
+    "TN ORDEN CARGA": "tn_orden_carga",
+    "TN CARGADAS": "tn_cargadas",
+    "AFORO": "aforo",
+
+    "TARIFA ASIGN": "tarifa_asign",
+    "FLETE COBRADO": "flete_cobrado",
+    "TARIFA TTE": "tarifa_tte",
+    "TARIFA TTE.": "tarifa_tte",
+    "FLETE PAGADO": "flete_pagado",
+
+    "DIFERENCIA": "diferencia",
+    "OBSERVACION": "observacion",
+    "OBSERVACION ": "observacion",
+    "OBSERVACIÓN": "observacion",
+}
+
+
+DATE_FORMATS = ("%d/%m/%Y", "%Y-%m-%d", "%d-%m-%Y")
+
+
+def _to_date(v):
+    if v is None or v == "":
+        return None
+    if isinstance(v, date) and not isinstance(v, datetime):
+        return v
+    if isinstance(v, datetime):
+        return v.date()
+
+    s = str(v).strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(s, fmt).date()
+        except ValueError:
+            pass
+    return None
+
+
+def _to_decimal(v):
+    if v is None or v == "":
+        return None
+    if isinstance(v, (int, float, Decimal)):
+        try:
+            return Decimal(str(v))
+        except InvalidOperation:
+            return None
+
+    s = str(v).strip().replace(" ", "")
+    # soporta 1.234,56 / 1234,56 / 1234.56
+    if s.count(",") == 1 and s.count(".") >= 1:
+        s = s.replace(".", "").replace(",", ".")
+    elif s.count(",") == 1 and s.count(".") == 0:
+        s = s.replace(",", ".")
+    try:
+        return Decimal(s)
+    except InvalidOperation:
+        return None
+
+
+def _find_header_row_and_map(ws):
+    """
+    Busca una fila con headers que contengan al menos O.CARGA y TRANSPORTISTA.
+    Devuelve: (header_row_idx, col_map) donde col_map = {field: col_index_1based}
+    """
+    # iter_rows lee la hoja una sola vez (ws.cell en read_only re-parsea la hoja en cada llamada)
+    for r, row in enumerate(ws.iter_rows(min_row=1, max_row=120, values_only=True), start=1):
+        col_map = {}
+        for c, raw in enumerate(row, start=1):
+            if raw is None:
+                continue
+            key = _norm(raw)
+
+            if key in EXPECTED_COLS:
+                col_map[EXPECTED_COLS[key]] = c
+                continue
+
+            # fallback por contains
+            if "CLIENTE" in key and "DESTINO" in key:
+                col_map["cliente_destino"] = c
+
+        if "o_carga" in col_map and "transportista" in col_map:
+            return r, col_map
+
+    return None, None
+
+
+# -------------------------
+# Parseo por columnas
+# -------------------------
+def _oc_text(v) -> str:
+    return str(v).strip() if v is not None else ""
+
+
+def read_data_rows(ws, header_row: int, col_map: dict, chunk_size: int = 5000, max_blank_streak: int = 200):
+    """
+    Recorre la hoja una sola vez desde header_row + 1 y devuelve lotes de
+    filas (tuplas) con O.Carga no vacío. Corta con max_blank_streak filas
+    sin O.Carga seguidas, igual que el loop original.
+    """
+    oc_idx = col_map["o_carga"] - 1
+    chunk = []
+    blank_streak = 0
+    for row in ws.iter_rows(min_row=header_row + 1, values_only=True):
+        oc = row[oc_idx] if oc_idx < len(row) else None
+        if not _oc_text(oc):
+            blank_streak += 1
+            if blank_streak >= max_blank_streak:
+                break
+            continue
+        blank_streak = 0
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def column(rows: list, col_map: dict, field: str) -> list:
+    """Valores crudos de un campo para un lote de filas (None si la columna no está)."""
+    if field not in col_map:
+        return [None] * len(rows)
+    idx = col_map[field] - 1
+    return [row[idx] if idx < len(row) else None for row in rows]
+
+
+# Tipo de conversión de cada campo del import (ver ColumnParser). O.Carga no
+# va acá: es único por fila, memoizarlo sólo llenaría el cache (ver _oc_text)
+COLUMN_KINDS = {
+    "transportista": "key",
+    "fecha": "date",
+    "km": "decimal",
+    "tn_orden_carga": "decimal",
+    "tn_cargadas": "decimal",
+    "aforo": "decimal",
+    "tarifa_asign": "decimal",
+    "flete_cobrado": "decimal",
+    "tarifa_tte": "decimal",
+    "flete_pagado": "decimal",
+    "dia": "text",
+    "cliente_destino": "text",
+    "cod_transporte": "text",
+    "ingrese_transporte": "text",
+    "observacion": "text",
+}
+
+# Textos distintos que se guardan por columna. Los que se repiten (fechas,
+# transportistas, destinos) aparecen enseguida; los que no (observaciones,
+# montos en texto) dejan de entrar al cache cuando se llena.
+CACHE_SIZE = 4096
+
+
+class ColumnParser:
+    """
+    Convierte una columna entera. kind:
+    - "date": como _to_date
+    - "decimal": como _to_decimal
+    - "text": str(v).strip() o None si queda vacío
+    - "key": str(v).strip() o "" (transportista)
+
+    Los textos se memoizan hasta max_size valores distintos (la planilla
+    repite fechas, números con formato, destinos y transportistas miles de
+    veces); con el cache lleno el resto se convierte sin guardar. Para fechas en texto se
+    prueba primero el último formato que funcionó en la columna: los
+    formatos de DATE_FORMATS no se superponen, así que el resultado es el
+    mismo que probarlos en orden.
+    Un ColumnParser es para una sola columna (el cache y el formato son de esa columna).
+    """
+
+    def __init__(self, kind: str, max_size: int = CACHE_SIZE):
+        self.kind = kind
+        self.max_size = max_size
+        self._cache = {}
+        self._date_formats = DATE_FORMATS
+        self._convert = {
+            "date": self._date,
+            "decimal": self._decimal,
+            "text": self._text,
+            "key": _oc_text,
+        }[kind]
+
+    def parse(self, values: list) -> list:
+        cache = self._cache
+        convert = self._convert
+        out = []
+        append = out.append
+        for v in values:
+            if v.__class__ is str:
+                try:
+                    append(cache[v])
+                except KeyError:
+                    r = convert(v)
+                    if len(cache) < self.max_size:
+                        cache[v] = r
+                    append(r)
+            else:
+                append(convert(v))
+        return out
+
+    def _date(self, v):
+        if v.__class__ is not str:
+            return _to_date(v)
+        if v == "":
+            return None
+        s = v.strip()
+        for fmt in self._date_formats:
+            try:
+                d = datetime.strptime(s, fmt).date()
+            except ValueError:
+                continue
+            if fmt != self._date_formats[0]:
+                # Este formato pasa adelante para las próximas celdas de la columna
+                self._date_formats = (fmt,) + tuple(f for f in DATE_FORMATS if f != fmt)
+            return d
+        return None
+
+    @staticmethod
+    def _decimal(v):
+        return _to_decimal(v)
+
+    @staticmethod
+    def _text(v):
+        if v is None:
+            return None
+        s = str(v).strip()
+        return s if s != "" else None
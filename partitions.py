@@ -0,0 +1,220 @@
+import os
+from datetime import date
+
+from sqlalchemy import text
+
+from .db import engine
+
+# Particionado mensual de "fletes" por "fecha" (opcional: FLETES_PARTITIONED=1)
+PARTITIONING_ENABLED = os.getenv("FLETES_PARTITIONED", "0") == "1"
+MONTHS_AHEAD = int(os.getenv("FLETES_PARTITION_MONTHS_AHEAD", "3"))
+
+# Meses con partición ya creada (cache del proceso)
+_known_months: set[date] = set()
+_partitioned = False
+
+
+def _month_start(d: date) -> date:
+    return date(d.year, d.month, 1)
+
+
+def _next_month(d: date) -> date:
+    return date(d.year + (d.month == 12), d.month % 12 + 1, 1)
+
+
+def month_range(anio_mes: str):
+    """
+    "202506" / "2025-06" -> (date(2025, 6, 1), date(2025, 7, 1))
+    Devuelve None si no tiene ese formato.
+    """
+    s = (anio_mes or "").strip().replace("-", "").replace(".", "")
+    if len(s) != 6 or not s.isdigit() or not 1 <= int(s[4:]) <= 12:
+        return None
+    desde = date(int(s[:4]), int(s[4:]), 1)
+    return desde, _next_month(desde)
+
+
+def _partition_ddl(month: date, parent: str = "fletes") -> str:
+    return f"""
+        CREATE TABLE IF NOT EXISTS {parent}_p{month:%Y%m}
+        PARTITION OF {parent}
+        FOR VALUES FROM ('{month.isoformat()}') TO ('{_next_month(month).isoformat()}');
+    """
+
+
+def is_partitioned(conn) -> bool:
+    return bool(conn.execute(text("""
+        SELECT 1 FROM pg_partitioned_table
+        WHERE partrelid = to_regclass('fletes')
+    """)).scalar())
+
+
+def _convert_to_partitioned(conn):
+    """
+    Rehace "fletes" como tabla particionada por mes de "fecha":
+    - fletes_pYYYYMM por mes, fletes_pdefault para filas sin fecha
+    - sin PRIMARY KEY: en una tabla particionada tiene que incluir "fecha"
+      (que puede ser NULL). La unicidad de id y o_carga la da el registro
+      fletes_o_carga (ver _ensure_registry)
+    """
+    conn.execute(text("""
+        CREATE TABLE fletes_new (LIKE fletes INCLUDING DEFAULTS INCLUDING GENERATED)
+        PARTITION BY RANGE (fecha);
+    """))
+    conn.execute(text("CREATE TABLE fletes_new_pdefault PARTITION OF fletes_new DEFAULT;"))
+
+    months = conn.execute(text("""
+        SELECT DISTINCT date_trunc('month', fecha)::date FROM fletes WHERE fecha IS NOT NULL
+    """)).scalars().all()
+    for m in months:
+        conn.execute(text(_partition_ddl(m, parent="fletes_new")))
+
+    cols = conn.execute(text("""
+        SELECT string_agg(quote_ident(column_name), ', ' ORDER BY ordinal_position)
+        FROM information_schema.columns
+        WHERE table_name = 'fletes' AND is_generated = 'NEVER'
+    """)).scalar()
+    conn.execute(text(f"INSERT INTO fletes_new ({cols}) SELECT {cols} FROM fletes;"))
+
+    conn.execute(text("ALTER SEQUENCE IF EXISTS fletes_id_seq OWNED BY fletes_new.id;"))
+    conn.execute(text("DROP TABLE fletes;"))
+    conn.execute(text("ALTER TABLE fletes_new RENAME TO fletes;"))
+    conn.execute(text("ALTER TABLE fletes_new_pdefault RENAME TO fletes_pdefault;"))
+    for m in months:
+        conn.execute(text(f"ALTER TABLE fletes_new_p{m:%Y%m} RENAME TO fletes_p{m:%Y%m};"))
+
+    conn.execute(text("""
+        ALTER TABLE fletes
+        ADD FOREIGN KEY (transportista_id) REFERENCES transportistas (id);
+    """))
+    for ddl in (
+        "CREATE INDEX IF NOT EXISTS ix_fletes_id ON fletes (id);",
+        "CREATE INDEX IF NOT EXISTS ix_fletes_o_carga ON fletes (o_carga);",
+        "CREATE INDEX IF NOT EXISTS ix_fletes_estado ON fletes (estado);",
+        "CREATE INDEX IF NOT EXISTS ix_fletes_fecha ON fletes (fecha);",
+        "CREATE INDEX IF NOT EXISTS ix_fletes_fecha_id_desc ON fletes (fecha DESC NULLS LAST, id DESC);",
+        "CREATE INDEX IF NOT EXISTS ix_fletes_estado_fecha ON fletes (estado, fecha, o_carga);",
+        "CREATE INDEX IF NOT EXISTS ix_fletes_transportista_fecha ON fletes (transportista_id, fecha);",
+        """CREATE INDEX IF NOT EXISTS ix_fletes_anio_mes
+           ON fletes (anio_mes) INCLUDE (flete_cobrado, flete_pagado, diferencia);""",
+    ):
+        conn.execute(text(ddl))
+
+    _ensure_registry(conn, rebuild=True)
+
+
+def _ensure_registry(conn, rebuild: bool = False):
+    """
+    fletes_o_carga: una fila por flete (caliente o archivado) con su
+    o_carga (PK) e id (UNIQUE). Lo mantiene un trigger sobre "fletes"; los
+    archivados siguen registrados, así no se pueden volver a cargar.
+    Con o sin particionado.
+    rebuild=True lo vuelve a llenar desde fletes + fletes_archivo.
+    """
+    has_id = conn.execute(text("""
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'fletes_o_carga' AND column_name = 'id'
+    """)).scalar()
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS fletes_o_carga (
+            o_carga VARCHAR(80) PRIMARY KEY
+        );
+    """))
+    if rebuild or not has_id:
+        # Registros creados antes de guardar el id: se rehacen
+        conn.execute(text("ALTER TABLE fletes_o_carga ADD COLUMN IF NOT EXISTS id INTEGER;"))
+        conn.execute(text("TRUNCATE fletes_o_carga;"))
+        conn.execute(text("""
+            INSERT INTO fletes_o_carga (o_carga, id)
+            SELECT o_carga, id FROM fletes
+            UNION ALL
+            SELECT o_carga, id FROM fletes_archivo;
+        """))
+        conn.execute(text("ALTER TABLE fletes_o_carga ALTER COLUMN id SET NOT NULL;"))
+        conn.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS ux_fletes_o_carga_id ON fletes_o_carga (id);"))
+
+    conn.execute(text("""
+        CREATE OR REPLACE FUNCTION fletes_o_carga_sync() RETURNS trigger AS $$
+        BEGIN
+            -- El archivado (ver archive.py) mueve la fila a fletes_archivo: la clave queda
+            IF TG_OP = 'UPDATE'
+               OR (TG_OP = 'DELETE' AND current_setting('fletes.archivando', true) IS DISTINCT FROM 'on') THEN
+                DELETE FROM fletes_o_carga WHERE o_carga = OLD.o_carga;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                INSERT INTO fletes_o_carga (o_carga, id) VALUES (NEW.o_carga, NEW.id);
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """))
+    conn.execute(text("DROP TRIGGER IF EXISTS tr_fletes_o_carga ON fletes;"))
+    conn.execute(text("""
+        CREATE TRIGGER tr_fletes_o_carga
+        AFTER INSERT OR DELETE OR UPDATE OF o_carga, id ON fletes
+        FOR EACH ROW EXECUTE FUNCTION fletes_o_carga_sync();
+    """))
+
+
+def ensure_partitioned_fletes():
+    """
+    Al arrancar (Postgres): convierte "fletes" si FLETES_PARTITIONED=1 y crea
+    las particiones del mes actual + MONTHS_AHEAD. El registro fletes_o_carga
+    se instala siempre: también sin particionar es lo único que impide volver
+    a cargar un O.Carga ya archivado (fletes y fletes_archivo tienen UNIQUE separados).
+    """
+    global _partitioned
+    with engine.begin() as conn:
+        _partitioned = is_partitioned(conn)
+        if not _partitioned and not PARTITIONING_ENABLED:
+            _ensure_registry(conn)
+            return
+        if not _partitioned:
+            conn.execute(text("LOCK TABLE fletes IN ACCESS EXCLUSIVE MODE;"))
+            _convert_to_partitioned(conn)
+            _partitioned = True
+        else:
+            _ensure_registry(conn)
+
+        m = _month_start(date.today())
+        for _ in range(MONTHS_AHEAD + 1):
+            conn.execute(text(_partition_ddl(m)))
+            m = _next_month(m)
+
+        existing = conn.execute(text("""
+            SELECT c.relname FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = to_regclass('fletes')
+        """)).scalars().all()
+    for name in existing:
+        suffix = name.removeprefix("fletes_p")
+        if suffix.isdigit():
+            _known_months.add(date(int(suffix[:4]), int(suffix[4:]), 1))
+
+
+def missing_partitions(fechas) -> set[date]:
+    """Meses de "fechas" que todavía no tienen partición."""
+    if not _partitioned:
+        return set()
+    return {_month_start(f) for f in fechas if f is not None} - _known_months
+
+
+def create_partitions(months):
+    """
+    Crea las particiones en una conexión aparte, en autocommit: el
+    CREATE TABLE ... PARTITION OF toma un ACCESS EXCLUSIVE sobre "fletes" y
+    así lo suelta enseguida en vez de tenerlo hasta el commit del request.
+    Quien llama no puede tener una transacción abierta que ya haya tocado
+    "fletes" (el DDL se quedaría esperando esos locks).
+    """
+    if not months:
+        return
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for m in sorted(months):
+            conn.execute(text(_partition_ddl(m)))
+    _known_months.update(months)
+
+
+def ensure_partition(fecha: date | None):
+    """Crea la partición del mes de "fecha" si falta (ver create_partitions)."""
+    create_partitions(missing_partitions([fecha]))
@@ -27,7 +27,6 @@ class FleteCreate(BaseModel):
     dia: Optional[str] = None
 
     o_carga: str = Field(min_length=1, max_length=80)
-    anio_mes: Optional[str] = None
 
     cliente_destino: Optional[str] = None
 
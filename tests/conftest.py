@@ -0,0 +1,6 @@
+import os
+import sys
+
+# El backend se despliega como paquete "app" (imports relativos); parsing.py
+# no depende de nada del paquete, así que los tests lo importan directo.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,70 @@
+import random
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+import pytest
+
+from parsing import CACHE_SIZE, ColumnParser, _oc_text, _to_date, _to_decimal
+
+
+def _text(v):
+    if v is None:
+        return None
+    s = str(v).strip()
+    return s if s != "" else None
+
+
+def _random_value(rng: random.Random):
+    d = date(2020, 1, 1) + timedelta(days=rng.randrange(2500))
+    return rng.choice([
+        None,
+        "",
+        "   ",
+        f"{d:%d/%m/%Y}",
+        f"{d:%Y-%m-%d}",
+        f" {d:%d-%m-%Y} ",
+        f"{d:%m/%d/%y}",
+        d,
+        datetime(d.year, d.month, d.day, rng.randrange(24), rng.randrange(60)),
+        rng.randrange(-1000, 100000),
+        rng.uniform(-1e6, 1e6),
+        round(rng.uniform(0, 5000), 2),
+        -0.0,
+        True,
+        Decimal(f"{rng.randrange(100000)}.{rng.randrange(100):02d}"),
+        f"{rng.randrange(1, 999)}.{rng.randrange(1000):03d},{rng.randrange(100):02d}",
+        f"{rng.randrange(100000)},{rng.randrange(100):02d}",
+        f"{rng.randrange(100000)}.{rng.randrange(100):02d}",
+        f"{rng.randrange(1000)} {rng.randrange(1000):03d},5",
+        "1.2.3",
+        "abc",
+        "NaN",
+        "1e3",
+        f"CLIENTE {rng.randrange(50):02d} / ROSARIO",
+    ])
+
+
+def _same(a, b) -> bool:
+    return type(a) is type(b) and str(a) == str(b)
+
+
+@pytest.mark.parametrize("max_size", [CACHE_SIZE, 16])
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("kind, reference", [
+    ("date", _to_date),
+    ("decimal", _to_decimal),
+    ("text", _text),
+    ("key", _oc_text),
+])
+def test_column_parser_matches_scalar_helpers(seed, kind, reference, max_size):
+    rng = random.Random(seed)
+    values = [_random_value(rng) for _ in range(3000)]
+    expected = [reference(v) for v in values]
+
+    parser = ColumnParser(kind, max_size=max_size)
+    # Dos pasadas: la segunda sale del cache y con los formatos de fecha reordenados
+    for _ in range(2):
+        got = parser.parse(values)
+        assert len(got) == len(expected)
+        assert all(_same(a, b) for a, b in zip(got, expected))
+        assert len(parser._cache) <= max_size